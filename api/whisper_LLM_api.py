@@ -1,14 +1,16 @@
 import os
 import sys
+import re
+import ast
+import functools
 import asyncio
 import time
 import logging
-import subprocess
 import nest_asyncio
 import warnings
 from tqdm import tqdm
 import numpy as np
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 from dotenv import load_dotenv
 
@@ -69,6 +71,8 @@ except ImportError as e:
 
 load_dotenv()
 THREAD_COUNT = int(os.getenv("THREAD_COUNT", "4"))
+# Maximum number of concurrent TTS requests (keep within the provider's rate limit)
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
 nest_asyncio.apply()
 
 # Resolution Mapping
@@ -91,6 +95,72 @@ def ensure_directories_exist(*dirs):
             os.makedirs(directory, exist_ok=True)
             logger.info(f"📁 Created missing directory: {directory}")
 
+async def gather_limited(coros, limit=TTS_CONCURRENCY):
+    """
+    Runs coroutines concurrently with at most `limit` in flight, preserving result order.
+    :param coros: Iterable of coroutines.
+    :param limit: Maximum number of coroutines running at once.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+@functools.lru_cache(maxsize=4)
+def _parse_api_keys(raw):
+    return ast.literal_eval(raw)
+
+def load_api_keys():
+    """
+    Returns the Gemini API keys from the `api_key` environment variable (a Python list literal).
+    The raw value is re-read each call, but only parsed again when it changes.
+    """
+    raw = os.getenv("api_key")
+    if raw is None:
+        raise ValueError("api_key environment variable is not set")
+    return _parse_api_keys(raw)
+
+# A line reading "## Page N" or "# Page N" (leading whitespace allowed) starts a new page
+_PAGE_HEADER_RE = re.compile(r'^[^\S\n]*#{1,2} Page.*$\n?', re.MULTILINE)
+
+def split_script_pages(script):
+    """
+    Splits an edited script on its page headers in one regex pass.
+    :param script: Script text with "## Page N" header lines.
+    :return: List of stripped, non-empty page texts.
+    """
+    return [page.strip() for page in _PAGE_HEADER_RE.split(script) if page.strip()]
+
+def count_pdf_pages(pdf_file_path, poppler_path=None):
+    """
+    Returns the page count from the PDF metadata without rasterizing any page.
+    :param pdf_file_path: Path to the PDF file.
+    :param poppler_path: Optional Poppler binary directory.
+    """
+    return int(pdfinfo_from_path(pdf_file_path, poppler_path=poppler_path)["Pages"])
+
+@functools.lru_cache(maxsize=None)
+def _speech_rate_subtitle_generator(traditional_chinese, chars_per_line):
+    """
+    Returns a shared SpeechRateSubtitleGenerator for the given settings, so the
+    converter probing in its constructor runs once per configuration.
+    """
+    return SpeechRateSubtitleGenerator(
+        traditional_chinese=traditional_chinese,
+        chars_per_line=chars_per_line
+    )
+
+@functools.lru_cache(maxsize=2)
+def _whisper_subtitle_generator(traditional_chinese):
+    """
+    Returns a shared WhisperSubtitleGenerator keyed on the Chinese conversion flag.
+    The instance keeps its loaded Whisper model, so later jobs skip reloading it.
+    """
+    return WhisperSubtitleGenerator(traditional_chinese=traditional_chinese)
+
 async def api(
     pdf_file_path: str,
     poppler_path: str,
@@ -124,7 +194,7 @@ async def api(
 
     # Step 4: Get API key and process PDF
     try:
-        keys = eval(os.getenv("api_key"))
+        keys = load_api_keys()
     except Exception as e:
         logger.error(f"❌ Error loading API key: {e}", exc_info=True)
         raise
@@ -134,18 +204,14 @@ async def api(
     # Detect total number of pages if 'all' is set
     try:
         if num_of_pages == "all":
-            total_pages = len(convert_from_path(
-                pdf_file_path, poppler_path=poppler_path, thread_count=THREAD_COUNT
-            ))
+            total_pages = count_pdf_pages(pdf_file_path, poppler_path)
             logger.info(f"📚 Detected total pages: {total_pages}")
         else:
             try:
                 total_pages = int(num_of_pages)
                 logger.info(f"📃 Selected Number of Pages: {num_of_pages}")
             except Exception:
-                total_pages = len(convert_from_path(
-                    pdf_file_path, poppler_path=poppler_path, thread_count=THREAD_COUNT
-                ))
+                total_pages = count_pdf_pages(pdf_file_path, poppler_path)
                 logger.info(f"📚 Detected total pages (fallback): {total_pages}")
     except Exception as e:
         logger.error(f"❌ Error reading PDF pages: {e}", exc_info=True)
@@ -178,8 +244,8 @@ async def api(
                 logger.info(f"🎤 Processing segment {idx} with voice: {voice}")
                 tasks.append(edge_tts_example(response, output_audio_dir, filename, voice))
         
-        # Gather results - fail immediately if any task fails
-        audio_files = await asyncio.gather(*tasks)
+        # Gather results (bounded by TTS_CONCURRENCY) - fail immediately if any task fails
+        audio_files = await gather_limited(tasks)
         
         # Strict validation - all audio files must be successfully generated
         failed_indices = []
@@ -223,7 +289,8 @@ async def api(
             poppler_path=poppler_path,
             first_page=1,
             last_page=total_pages,
-            thread_count=THREAD_COUNT
+            thread_count=THREAD_COUNT,
+            size=(TARGET_WIDTH, TARGET_HEIGHT)
         )
     except Exception as e:
         logger.error(f"❌ PDF to image conversion failed: {e}", exc_info=True)
@@ -233,8 +300,10 @@ async def api(
     video_clips = []
     try:
         for idx, (img, audio_file) in enumerate(tqdm(zip(pages, audio_files), total=len(audio_files), desc="Processing Videos")):
-            img_resized = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)
-            frame = np.array(img_resized)
+            # Poppler already renders at the target size; only resize on mismatch
+            if img.size != (TARGET_WIDTH, TARGET_HEIGHT):
+                img = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)
+            frame = np.array(img)
             
             # All audio files are guaranteed to exist at this point
             audioclip = AudioFileClip(audio_file)
@@ -255,7 +324,6 @@ async def api(
         raise
 
     # Step 12: Export final video with unique filename
-    import time
     timestamp = int(time.time())
     output_video_path = os.path.join(output_video_dir, f"output_video_{resolution}p_{timestamp}.mp4")
     logger.info(f"📤 Exporting final video to: {output_video_path}")
@@ -324,19 +392,7 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
         f.write(edited_script)
     
     # Parse edited script into pages
-    pages = []
-    current_page = ""
-    
-    for line in edited_script.split('\n'):
-        if line.strip().startswith('## Page') or line.strip().startswith('# Page'):
-            if current_page.strip():
-                pages.append(current_page.strip())
-            current_page = ""
-        else:
-            current_page += line + '\n'
-    
-    if current_page.strip():
-        pages.append(current_page.strip())
+    pages = split_script_pages(edited_script)
     
     logger.info(f"📝 Parsed {len(pages)} pages from edited script")
     
@@ -349,7 +405,8 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
             poppler_path=poppler_path,
             first_page=1,
             last_page=num_pages_needed,
-            thread_count=THREAD_COUNT
+            thread_count=THREAD_COUNT,
+            size=(TARGET_WIDTH, TARGET_HEIGHT)
         )
         logger.info(f"✅ Successfully converted {len(pdf_images)} PDF pages to images (needed: {num_pages_needed})")
     except Exception as e:
@@ -373,8 +430,8 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
                 logger.info(f"🎤 Processing segment {idx} with voice: {voice}")
                 tasks.append(edge_tts_example(page_text, output_audio_dir, filename, voice))
         
-        # Generate all audio files
-        audio_files = await asyncio.gather(*tasks)
+        # Generate all audio files (bounded by TTS_CONCURRENCY)
+        audio_files = await gather_limited(tasks)
         
         # Validate audio files
         valid_audio_files = []
@@ -409,8 +466,10 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
     try:
         for idx, (img, audio_file) in enumerate(zip(pdf_images, valid_audio_files)):
             # Resize image to target resolution
-            img_resized = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)
-            frame = np.array(img_resized)
+            # Poppler already renders at the target size; only resize on mismatch
+            if img.size != (TARGET_WIDTH, TARGET_HEIGHT):
+                img = img.resize((TARGET_WIDTH, TARGET_HEIGHT), Image.LANCZOS)
+            frame = np.array(img)
             
             # Create audio and video clips
             audioclip = AudioFileClip(audio_file)
@@ -431,7 +490,6 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
         final_video = concatenate_videoclips(video_clips, method="chain")
         
         # Use unique filename with timestamp
-        import time
         timestamp = int(time.time())
         output_video_path = os.path.join(output_video_dir, f"output_video_{resolution}p_{timestamp}.mp4")
         logger.info(f"📤 Exporting final video to: {output_video_path}")
@@ -475,12 +533,8 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
                                 # 如果已經是列表，直接使用
                                 reference_texts = edited_script
                             elif isinstance(edited_script, str):
-                                # 如果是字符串，按照## Page N的格式分割
-                                import re
-                                # 分割按頁面
-                                pages = re.split(r'## Page \d+\n', edited_script)
-                                # 移除空字符串並清理內容
-                                reference_texts = [page.strip() for page in pages if page.strip()]
+                                # 如果是字符串，按照## Page N的格式分割（與生成影片時的分頁一致）
+                                reference_texts = split_script_pages(edited_script)
                             else:
                                 logger.warning(f"⚠️ Unexpected edited_script type: {type(edited_script)}")
                                 reference_texts = []
@@ -496,10 +550,7 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
                     
                     # 使用基於語速計算的字幕生成器
                     chars_per_line = 25  # 單行顯示，增加字符數
-                    subtitle_generator = SpeechRateSubtitleGenerator(
-                        traditional_chinese=traditional_chinese,
-                        chars_per_line=chars_per_line
-                    )
+                    subtitle_generator = _speech_rate_subtitle_generator(traditional_chinese, chars_per_line)
                     
                     # Create temporary video path for subtitle processing
                     temp_video_path = output_video_path.replace('.mp4', '_temp.mp4')
@@ -524,7 +575,7 @@ async def api_with_edited_script(pdf_file_path, edited_script, poppler_path, out
                         logger.warning("⚠️ No reference texts available, skipping subtitle generation")
                         # 回退到標準 Whisper 字幕
                         if WhisperSubtitleGenerator:
-                            subtitle_generator = WhisperSubtitleGenerator(traditional_chinese=traditional_chinese)
+                            subtitle_generator = _whisper_subtitle_generator(traditional_chinese)
                             success = subtitle_generator.process_video_with_subtitles(
                                 input_video_path=temp_video_path,
                                 output_video_path=output_video_path,
@@ -581,7 +632,7 @@ async def api_generate_text_only(
 
     # Get API key
     try:
-        keys = eval(os.getenv("api_key"))
+        keys = load_api_keys()
     except Exception as e:
         logger.error(f"❌ Error loading API key: {e}", exc_info=True)
         raise
@@ -591,18 +642,14 @@ async def api_generate_text_only(
     # Detect total number of pages
     try:
         if num_of_pages == "all":
-            total_pages = len(convert_from_path(
-                pdf_file_path, poppler_path=poppler_path, thread_count=THREAD_COUNT
-            ))
+            total_pages = await asyncio.to_thread(count_pdf_pages, pdf_file_path, poppler_path)
             logger.info(f"📚 Detected total pages: {total_pages}")
         else:
             try:
                 total_pages = int(num_of_pages)
                 logger.info(f"📃 Selected Number of Pages: {num_of_pages}")
             except Exception:
-                total_pages = len(convert_from_path(
-                    pdf_file_path, poppler_path=poppler_path, thread_count=THREAD_COUNT
-                ))
+                total_pages = await asyncio.to_thread(count_pdf_pages, pdf_file_path, poppler_path)
                 logger.info(f"📚 Detected total pages (fallback): {total_pages}")
     except Exception as e:
         logger.error(f"❌ Error reading PDF pages: {e}", exc_info=True)
@@ -610,7 +657,7 @@ async def api_generate_text_only(
 
     # Extract text from PDF
     try:
-        text_array = pdf_to_text_array(pdf_file_path)
+        text_array = await asyncio.to_thread(pdf_to_text_array, pdf_file_path)
     except Exception as e:
         logger.error(f"❌ Error extracting text from PDF: {e}", exc_info=True)
         raise
@@ -618,7 +665,9 @@ async def api_generate_text_only(
     # Generate AI responses
     logger.info(f"🤖 Generating AI responses for {total_pages} pages...")
     try:
-        response_array = gemini_chat(text_array[:total_pages], script=script, keys=keys)
+        # gemini_chat is synchronous (blocking requests and time.sleep retries); run it in a worker
+        # thread so the caller's event loop stays free for other requests
+        response_array = await asyncio.to_thread(gemini_chat, text_array[:total_pages], script=script, keys=keys)
         logger.info(f"✅ Successfully generated text for {len(response_array)} pages")
         return response_array
     except Exception as e:
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify, flash, session
+from flask import Flask, render_template, request, redirect, url_for, send_file, send_from_directory, jsonify, flash, session, g, has_request_context
 import os
 import asyncio
 import threading
@@ -8,18 +8,35 @@ import secrets
 import sys
 import warnings
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
 from api.whisper_LLM_api import api, api_with_edited_script, api_generate_text_only
-from pyngrok import ngrok
-from dotenv import load_dotenv
+from config.api_config import POLICIES, classify_error
 import json
 import tempfile
-from pdf2image import convert_from_path
-from PIL import Image
-import io
-import base64
+import subprocess
+import functools
+import hashlib
+import itertools
 import logging
+import logging.handlers
+import queue
 from datetime import datetime
 import traceback
+import atexit
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# orjson 為選用加速套件；未安裝時退回標準 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# flask-compress 為選用套件：安裝後以 gzip/br 壓縮 JSON 與 HTML 回應
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
 
 # ✅ 設置簡化的日誌系統
 def setup_logging():
@@ -27,14 +44,26 @@ def setup_logging():
     # 創建日誌格式
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
+    # 實際寫檔/輸出交給 QueueListener 執行緒，記錄日誌的執行緒只需把紀錄放進佇列
+    formatter = logging.Formatter(log_format)
+    file_handler = logging.FileHandler('app.log', encoding='utf-8')
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # 佇列中只放訊息本身，格式化由 listener 端的 handler 負責
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
     # 配置根日誌記錄器（只顯示WARNING及以上級別）
     logging.basicConfig(
         level=logging.WARNING,
-        format=log_format,
-        handlers=[
-            logging.FileHandler('app.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
+        handlers=[queue_handler]
     )
     
     # 設置第三方庫的日誌級別
@@ -52,10 +81,19 @@ def setup_logging():
 app_logger = setup_logging()
 
 # ✅ 字體支援檢查和安裝
+# 檢查/安裝成功後留下的標記檔，同一台機器（同一個 Colab 工作階段）重啟時直接略過
+FONT_CHECK_MARKER = os.path.join(tempfile.gettempdir(), ".cjk_ok")
+
+def _mark_font_support_ok():
+    try:
+        open(FONT_CHECK_MARKER, "w").close()
+    except OSError:
+        pass
+
 def ensure_chinese_font_support():
     """確保系統支援中文字體"""
-    import platform
-    import subprocess
+    if os.path.exists(FONT_CHECK_MARKER):
+        return True
     
     try:
         system = platform.system().lower()
@@ -68,16 +106,18 @@ def ensure_chinese_font_support():
                 "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"
             ]
             
-            fonts_found = [path for path in font_paths if os.path.exists(path)]
-            
-            if fonts_found:
+            # 只需知道是否至少有一個字體存在：any() 找到第一個即停止，不必 stat 全部路徑
+            if any(os.path.exists(path) for path in font_paths):
+                _mark_font_support_ok()
                 return True
             else:
                 try:
                     # 嘗試安裝字體
                     subprocess.run(['apt-get', 'update'], check=False, capture_output=True)
-                    subprocess.run(['apt-get', 'install', '-y', 'fonts-noto-cjk'], check=False, capture_output=True)
+                    installed = subprocess.run(['apt-get', 'install', '-y', 'fonts-noto-cjk'], check=False, capture_output=True)
                     subprocess.run(['fc-cache', '-f', '-v'], check=False, capture_output=True)
+                    if installed.returncode == 0:
+                        _mark_font_support_ok()
                     return True
                 except Exception as e:
                     app_logger.warning(f"⚠️ 字體安裝失敗: {e}")
@@ -90,8 +130,8 @@ def ensure_chinese_font_support():
         app_logger.error(f"❌ 字體檢查失敗: {e}")
         return False
 
-# 啟動時檢查字體支援
-ensure_chinese_font_support()
+# 啟動時在背景檢查字體支援（apt-get 安裝可能需要數十秒，不阻塞伺服器啟動）
+threading.Thread(target=ensure_chinese_font_support, name="font-check", daemon=True).start()
 
 # ✅ Suppress warnings and error messages
 warnings.filterwarnings("ignore")
@@ -99,16 +139,7 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow warnings
 os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Disable CUDA warnings if not needed
 os.environ['XDG_RUNTIME_DIR'] = '/tmp/runtime-root'  # Fix XDG_RUNTIME_DIR warning
 
-# Suppress ALSA warnings
-try:
-    import alsaaudio
-    # Redirect stderr to devnull temporarily for ALSA
-    stderr = sys.stderr
-    sys.stderr = open(os.devnull, 'w')
-except ImportError:
-    pass
-
-load_dotenv()
+# .env 已在匯入 api.whisper_LLM_api 時載入一次，這裡不再重複解析
 
 # ✅ Flask Configuration
 app = Flask(__name__)
@@ -117,169 +148,241 @@ app.config["SESSION_TYPE"] = "filesystem"
 app.config["SESSION_PERMANENT"] = False
 app.config["SESSION_USE_SIGNER"] = True
 
+# ✅ 回應壓縮（僅 text/json 類型；影片與預覽圖本身已壓縮，不會再處理）
+if Compress is not None:
+    Compress(app)
+
 # ✅ 簡化的日誌中間件（僅記錄錯誤）
+_QUIET_ENDPOINTS = frozenset({"check_status", "list_output_files", "cleanup_status"})
+
 @app.before_request
 def log_request_info():
     """僅記錄重要的請求信息"""
-    # 只記錄POST請求和錯誤
+    # 輪詢端點不記錄；其餘只在 DEBUG 啟用時記錄 POST 請求
+    if request.endpoint in _QUIET_ENDPOINTS or not app_logger.isEnabledFor(logging.DEBUG):
+        return
     if request.method == 'POST':
-        app_logger.debug(f"POST請求: {request.endpoint}")
+        app_logger.debug("POST請求: %s", request.endpoint)
 
 @app.after_request
 def log_response_info(response):
     """僅記錄錯誤響應"""
     # 只記錄錯誤響應
     if response.status_code >= 400:
-        app_logger.error(f"錯誤響應: {response.status_code} - {request.url}")
-    return response
+        app_logger.error("錯誤響應: %s - %s", response.status_code, request.url)
     return response
 
+@app.before_request
+def reject_oversized_upload():
+    """依 Content-Length 提前拒絕過大的上傳，不必等到解析本文（沒有 Content-Length 的 chunked 上傳由路由重新拋出 413）"""
+    max_length = app.config["MAX_CONTENT_LENGTH"]
+    if request.content_length is not None and request.content_length > max_length:
+        return upload_too_large(None)
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    """上傳超過 MAX_CONTENT_LENGTH 時回傳 JSON，讓前端能顯示錯誤訊息"""
+    limit_mb = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+    return jsonify({"status": "error", "message": f"⚠️ 檔案過大，上限為 {limit_mb} MB。"}), 413
+
 # ✅ Get absolute paths relative to the script directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.config["UPLOAD_FOLDER"] = os.path.join(BASE_DIR, "uploads")
 app.config["OUTPUT_FOLDER"] = os.path.join(BASE_DIR, "output")
 app.config["ALLOWED_EXTENSIONS"] = {"mp4", "pdf"}
+# 在 Apache (mod_xsendfile) 等反向代理之後執行時，可改由前端伺服器直接送檔，釋放 Python 工作執行緒
+app.use_x_sendfile = os.getenv("USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
+# 上傳大小上限（預設 2 GB）：超過時在讀取本文前就以 413 拒絕，不會先寫入暫存檔
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", "2048")) * 1024 * 1024
 
 system_os = platform.system()
 
+# ✅ Poppler 路徑在啟動時決定一次（Windows 使用隨附的 Poppler，其餘平台使用系統安裝版本）
+POPPLER_PATH = os.path.join(BASE_DIR, "poppler", "poppler-0.89.0", "bin") if system_os == "Windows" else None
+
 # ✅ Ensure Upload & Output Folders Exist
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 os.makedirs(app.config["OUTPUT_FOLDER"], exist_ok=True)
 
-# ✅ Check Allowed File Types
-def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in app.config["ALLOWED_EXTENSIONS"]
+# ✅ 使用者資料夾路徑在啟動時計算一次，避免每個請求重新 join
+USER_DIR = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
+VIDEO_DIR = os.path.join(USER_DIR, "video")
+AUDIO_DIR = os.path.join(USER_DIR, "audio")
+TEXT_OUTPUT_FILE = os.path.join(USER_DIR, "text_output.txt")
+BACKUP_FILE = os.path.join(USER_DIR, "session_backup.jsonl")
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+def _save_upload(file_storage, dest_path):
+    """以大緩衝區將上傳檔案寫入磁碟，回傳寫入的位元組數"""
+    with open(dest_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as dst:
+        shutil.copyfileobj(file_storage.stream, dst, UPLOAD_CHUNK_SIZE)
+        return dst.tell()
+
+# ✅ 請求 / 作業 ID：單調時鐘加上計數器，保證唯一且不需格式化時間
+_REQ_SEQ = itertools.count()
+
+def _req_id():
+    return f"{time.monotonic_ns():x}-{next(_REQ_SEQ)}"
+
+# ✅ 記憶體內處理狀態（/status 唯一的狀態來源，輪詢不需碰觸檔案系統）
+STATUS = {"state": "idle", "message": "No processing in progress", "version": 0}
+STATUS_CHANGED = threading.Condition()
+
+def set_status(state, message):
+    """更新處理狀態並喚醒所有等待中的 /status 請求"""
+    with STATUS_CHANGED:
+        STATUS["state"] = state
+        STATUS["message"] = message
+        STATUS["version"] += 1
+        STATUS_CHANGED.notify_all()
+
+def _job_running():
+    return STATUS["state"] == "processing"
+
+def _try_begin_job():
+    """原子地檢查並標記作業開始；已有作業進行中時回傳 False（所有作業共用同一個輸出資料夾）"""
+    with STATUS_CHANGED:
+        if _job_running():
+            return False
+        set_status("processing", "Processing... Please wait")
+        return True
+
+def _job_busy_response():
+    response = jsonify({"status": "error", "message": "⏳ 已有影片正在生成中，請等待完成後再試。"})
+    response.status_code = 429
+    response.headers["Retry-After"] = "10"
+    return response
+
+# ✅ 背景事件循環：常駐於獨立執行緒，讓耗時的檔案操作不佔用請求執行緒
+BG_LOOP = asyncio.new_event_loop()
+threading.Thread(target=BG_LOOP.run_forever, name="bg-loop", daemon=True).start()
+
+# ✅ 作業事件循環：所有影片生成作業共用同一個常駐事件循環，不再每個作業建立/關閉一次
+# （與 BG_LOOP 分開：生成流程中仍有同步的 PDF 轉圖與影片輸出，不應卡住背景清理）
+JOB_LOOP = asyncio.new_event_loop()
+threading.Thread(target=JOB_LOOP.run_forever, name="job-loop", daemon=True).start()
+
+# ✅ 文字生成事件循環：/generate_text 共用的常駐事件循環（與 JOB_LOOP 分開，影片輸出時仍可生成文字）
+# 同步的 PDF 解析與 Gemini 呼叫都以 asyncio.to_thread 交給執行緒池，迴圈本身不會被阻塞，多個請求可同時進行
+TEXT_LOOP = asyncio.new_event_loop()
+threading.Thread(target=TEXT_LOOP.run_forever, name="text-loop", daemon=True).start()
+# 文字生成等待上限（秒）：逾時就回 504，請求執行緒不會被卡住的 Gemini 呼叫永久佔住
+TEXT_GENERATION_TIMEOUT = int(os.getenv("TEXT_GENERATION_TIMEOUT", "900"))
+
+# 同時執行的生成作業上限（所有作業共用同一個使用者資料夾，預設一次一個）
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "1"))
+JOB_SEMAPHORE = asyncio.Semaphore(JOB_CONCURRENCY)
+
+async def _run_limited(coro):
+    """在 JOB_SEMAPHORE 限制下執行作業協程"""
+    async with JOB_SEMAPHORE:
+        return await coro
+
+def submit_job(coro):
+    """將作業協程提交到 JOB_LOOP，回傳 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(_run_limited(coro), JOB_LOOP)
 
 # ✅ Background Processing Task
-def run_processing(pdf_path, num_of_pages, resolution, user_folder, TTS_model_type, extra_prompt, voice):
-    """背景處理任務，只記錄重要信息"""
-    process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-    print(f"🚀 開始處理作業 ID: {process_id}")  # 使用print代替日誌
-    
+def _list_ext(folder, ext):
+    """列出資料夾內指定副檔名的檔名；資料夾不存在時回傳空清單（不另外 exists 檢查）"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # 🧹 清理舊檔案：在開始新處理前清除所有舊的輸出檔案
-        video_folder = os.path.join(user_folder, 'video')
-        audio_folder = os.path.join(user_folder, 'audio')
-        
-        # 刪除舊的影片和音檔
-        deleted_folders = []
-        for folder in [video_folder, audio_folder]:
-            if os.path.exists(folder):
-                try:
-                    import shutil
-                    shutil.rmtree(folder)
-                    deleted_folders.append(folder)
-                except Exception as e:
-                    app_logger.error(f"❌ 清理失敗 {folder}: {e}")
-        
-        # 重新建立資料夾
-        os.makedirs(video_folder, exist_ok=True)
-        os.makedirs(audio_folder, exist_ok=True)
-        
-        status_file = os.path.join(video_folder, "processing.txt")
-        
-        with open(status_file, "w") as f:
-            f.write("processing")
-        
-        try:
-            start_time = datetime.now()
-            
-            loop.run_until_complete(api(
-                pdf_file_path=pdf_path,
-                poppler_path=None,
-                output_audio_dir=os.path.join(user_folder, 'audio'),
-                output_video_dir=os.path.join(user_folder, 'video'),
-                output_text_path=os.path.join(user_folder, "text_output.txt"),
-                num_of_pages=num_of_pages,
-                resolution=int(resolution),
-                tts_model=TTS_model_type,
-                extra_prompt=extra_prompt,
-                voice=voice
-            ))
-            
-            end_time = datetime.now()
-            processing_time = (end_time - start_time).total_seconds()
-            print(f"⏱️ 處理完成，耗時: {processing_time:.2f} 秒")
-            
-            # ✅ 立即刪除處理狀態檔案，讓用戶可以下載影片
-            if os.path.exists(status_file):
-                os.remove(status_file)
-            
-            # 檢查輸出檔案
-            video_files = [f for f in os.listdir(video_folder) if f.endswith('.mp4')] if os.path.exists(video_folder) else []
-            
-            if video_files:
-                print(f"✅ 作業 {process_id} 完成，生成 {len(video_files)} 個檔案")
-            else:
-                print(f"⚠️ 作業 {process_id} 完成，但未找到輸出檔案")
-            
-        except Exception as api_error:
-            app_logger.error(f"❌ API 呼叫失敗: {api_error}")
-            app_logger.error(f"❌ 錯誤詳情: {traceback.format_exc()}")
-            raise
-            
-    except Exception as e:
-        app_logger.error(f"❌ 作業 {process_id} 處理失敗: {e}")
-        app_logger.error(f"❌ 完整錯誤追蹤: {traceback.format_exc()}")
-        
-        with open(status_file, "w") as f:
-            f.write("failed")
-        app_logger.info(f"📝 狀態檔案已更新為失敗")
-    finally:
-        try:
-            loop.close()
-            app_logger.info(f"⚙️ 事件循環已關閉")
-        except Exception as loop_error:
-            app_logger.error(f"❌ 關閉事件循環失敗: {loop_error}")
+        with os.scandir(folder) as it:
+            return [entry.name for entry in it if entry.name.endswith(ext)]
+    except FileNotFoundError:
+        return []
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    # 🧹 清理舊檔案：在開始新處理前清除所有舊的輸出檔案
-    video_folder = os.path.join(user_folder, 'video')
-    audio_folder = os.path.join(user_folder, 'audio')
+def _fast_rmtree(path):
+    """刪除整個資料夾：非 Windows 交給原生 rm -rf（單次 fork/exec，比逐檔 os.unlink 快）；失敗時記錄錯誤"""
+    if system_os != "Windows":
+        try:
+            result = subprocess.run(["rm", "-rf", "--", path], check=False, stderr=subprocess.PIPE)
+        except OSError:
+            pass
+        else:
+            if result.returncode != 0:
+                app_logger.error(f"❌ 清理失敗 {path}: {result.stderr.decode(errors='replace').strip()}")
+            return
     
+    # 收集無法刪除的項目（資料夾本來就不存在時略過），整個資料夾只記錄一行
+    errors = []
+    def on_error(func, failed_path, exc_info):
+        if not isinstance(exc_info[1], FileNotFoundError):
+            errors.append((failed_path, exc_info[1]))
+    shutil.rmtree(path, onerror=on_error)
+    if errors:
+        failed_path, error = errors[0]
+        app_logger.error(f"❌ 清理失敗 {path}: {len(errors)} 個項目無法刪除（{failed_path}: {error}）")
+
+_MISSING = object()
+
+def _prepare_output_folders(video_folder, audio_folder):
+    """清除上一次的影片與音檔並重建資料夾"""
     # 刪除舊的影片和音檔
-    for folder in [video_folder, audio_folder]:
-        if os.path.exists(folder):
-            try:
-                import shutil
-                shutil.rmtree(folder)
-                app.logger.info(f"🗑️ Cleaned old files in: {folder}")
-            except Exception as e:
-                app.logger.warning(f"⚠️ Could not clean folder {folder}: {e}")
+    for folder in (video_folder, audio_folder):
+        _fast_rmtree(folder)
     
     # 重新建立資料夾
     os.makedirs(video_folder, exist_ok=True)
     os.makedirs(audio_folder, exist_ok=True)
+
+async def _processing_job(pdf_path, num_of_pages, resolution, TTS_model_type, extra_prompt, voice):
+    """在 JOB_LOOP 上執行的影片生成流程"""
+    # 🧹 清理舊檔案：在開始新處理前清除所有舊的輸出檔案（檔案操作交給執行緒，不佔用事件循環）
+    await asyncio.to_thread(_prepare_output_folders, VIDEO_DIR, AUDIO_DIR)
     
-    status_file = os.path.join(video_folder, "processing.txt")
-    with open(status_file, "w") as f:
-        f.write("processing")
+    start_time = datetime.now()
     try:
-        loop.run_until_complete(api(
+        await api(
             pdf_file_path=pdf_path,
             poppler_path=None,
-            output_audio_dir=os.path.join(user_folder, 'audio'),
-            output_video_dir=os.path.join(user_folder, 'video'),
-            output_text_path=os.path.join(user_folder, "text_output.txt"),
+            output_audio_dir=AUDIO_DIR,
+            output_video_dir=VIDEO_DIR,
+            output_text_path=TEXT_OUTPUT_FILE,
             num_of_pages=num_of_pages,
             resolution=int(resolution),
             tts_model=TTS_model_type,
             extra_prompt=extra_prompt,
             voice=voice
-        ))
-        # ✅ 立即刪除處理狀態檔案，讓用戶可以下載影片
-        if os.path.exists(status_file):
-            os.remove(status_file)
-        app.logger.info("✅ Video Processing Completed!")
-    except Exception as e:
-        app.logger.error(f"❌ Error during processing: {e}", exc_info=True)
-        with open(status_file, "w") as f:
-            f.write("failed")
+        )
+    except Exception as api_error:
+        app_logger.error(f"❌ API 呼叫失敗: {api_error}")
+        raise
+    
+    processing_time = (datetime.now() - start_time).total_seconds()
+    print(f"⏱️ 處理完成，耗時: {processing_time:.2f} 秒")
+
+def _on_processing_done(process_id, future):
+    """作業結束時更新記憶體狀態"""
+    error = future.exception()
+    
+    if error is None:
+        # ✅ 立即更新狀態，讓用戶可以下載影片
+        set_status("completed", "Video generation completed!")
+        
+        # 檢查輸出檔案
+        video_files = _list_ext(VIDEO_DIR, ".mp4")
+        
+        if video_files:
+            print(f"✅ 作業 {process_id} 完成，生成 {len(video_files)} 個檔案")
+        else:
+            print(f"⚠️ 作業 {process_id} 完成，但未找到輸出檔案")
+        return
+    
+    app_logger.error(f"❌ 作業 {process_id} 處理失敗: {error}", exc_info=error)
+    
+    set_status("failed", "Processing failed")
+
+def run_processing(pdf_path, num_of_pages, resolution, TTS_model_type, extra_prompt, voice):
+    """將影片生成作業提交到共用的 JOB_LOOP，立即回傳 Future"""
+    process_id = _req_id()
+    print(f"🚀 開始處理作業 ID: {process_id}")  # 使用print代替日誌
+    
+    future = submit_job(
+        _processing_job(pdf_path, num_of_pages, resolution, TTS_model_type, extra_prompt, voice)
+    )
+    future.add_done_callback(functools.partial(_on_processing_done, process_id))
+    return future
 
 # ✅ Home Route
 @app.route("/")
@@ -289,10 +392,10 @@ def index():
 # ✅ Process Video Route
 @app.route("/process", methods=["POST"])
 def process_video():
-    request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    request_id = _req_id()
     app_logger.info(f"🎬 開始處理視頻請求 ID: {request_id}")
     
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
+    user_folder = USER_DIR
     os.makedirs(user_folder, exist_ok=True)
     app_logger.info(f"📁 用戶資料夾: {user_folder}")
     
@@ -323,31 +426,36 @@ def process_video():
             app_logger.warning(f"⚠️ 請求 {request_id} - 沒有上傳 PDF 檔案")
             return jsonify({"status": "error", "message": "⚠️ Please upload a PDF file."}), 400
 
+        # 已有作業進行中時不覆寫其輸入 PDF，直接拒絕
+        if _job_running():
+            app_logger.warning(f"⚠️ 請求 {request_id} - 已有作業進行中")
+            return _job_busy_response()
+
         # 處理PDF檔案
         pdf_filename = secure_filename(pdf_file.filename)
         pdf_path = os.path.join(user_folder, pdf_filename)
         app_logger.info(f"💾 儲存 PDF 檔案: {pdf_path}")
         
         try:
-            pdf_file.save(pdf_path)
-            file_size = os.path.getsize(pdf_path) / (1024 * 1024)  # MB
+            file_size = _save_upload(pdf_file, pdf_path) / (1024 * 1024)  # MB
             app_logger.info(f"✅ PDF 檔案儲存成功: {file_size:.2f} MB")
+            _discard_preview_cache()
         except Exception as save_error:
             app_logger.error(f"❌ PDF 檔案儲存失敗: {save_error}")
             raise
 
-        # 啟動背景處理
-        app_logger.info(f"🚀 啟動背景處理線程...")
-        processing_thread = threading.Thread(
-            target=run_processing, args=(
-                pdf_path, num_of_pages, resolution, user_folder, TTS_model_type, extra_prompt, voice
-            )
-        )
-        processing_thread.start()
-        app_logger.info(f"✅ 請求 {request_id} - 背景處理線程已啟動")
+        # 啟動背景處理（先更新狀態，避免第一次輪詢讀到上一個作業的結果）
+        app_logger.info(f"🚀 提交背景處理作業...")
+        if not _try_begin_job():
+            return _job_busy_response()
+        run_processing(pdf_path, num_of_pages, resolution, TTS_model_type, extra_prompt, voice)
+        app_logger.info(f"✅ 請求 {request_id} - 背景處理作業已提交")
         
         return jsonify({"status": "success", "message": "Processing... Please wait"}), 200
         
+    except RequestEntityTooLarge:
+        # chunked 上傳沒有 Content-Length，讀取本文時才超過上限；交給 413 handler 回傳 JSON
+        raise
     except Exception as e:
         app_logger.error(f"❌ 請求 {request_id} 處理失敗: {e}")
         app_logger.error(f"❌ 完整錯誤追蹤: {traceback.format_exc()}")
@@ -364,7 +472,7 @@ def download():
 def download_file(filename):
     app_logger.info(f"📥 下載請求: {filename}")
     
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user", 'video')
+    user_folder = VIDEO_DIR
     if not filename:
         app_logger.warning(f"⚠️ 無效的檔案請求")
         flash("⚠️ Invalid file request!", "error")
@@ -374,31 +482,72 @@ def download_file(filename):
     file_path = os.path.join(user_folder, secure_file)
     
     app_logger.info(f"📂 尋找檔案: {file_path}")
-    app_logger.info(f"🛠️ 檔案存在: {os.path.exists(file_path)}")
     
-    if os.path.exists(file_path):
-        file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
-        app_logger.info(f"✅ 開始下載: {filename} ({file_size:.2f} MB)")
-        return send_file(file_path, as_attachment=True)
-    else:
+    # 不先 exists / getsize：直接送檔，檔案不存在時 send_from_directory 會拋出 NotFound
+    try:
+        # conditional=True：支援 ETag / If-Modified-Since / Range，續傳或重複下載不必重送整個檔案
+        response = send_from_directory(user_folder, secure_file, as_attachment=True, conditional=True, etag=True)
+    except NotFound:
         app_logger.warning(f"❌ 檔案不存在: {file_path}")
         flash("⚠️ File not found!", "error")
         return redirect(url_for("download"))
+    
+    if app_logger.isEnabledFor(logging.INFO):
+        app_logger.info("✅ 開始下載: %s (%.2f MB)", filename, (response.content_length or 0) / (1024 * 1024))
+    return response
+
+# ✅ 輪詢端點的短暫快取：ETag + Cache-Control，內容未變時回 304
+POLL_CACHE_CONTROL = "max-age=1"
+# 長輪詢的 /status 逾時後會立刻以相同網址再次請求，不能讓瀏覽器直接用快取回應（否則會空轉），
+# 因此每次都回伺服器驗證，仍以 ETag 回 304
+STATUS_CACHE_CONTROL = "no-cache"
+
+def _dir_mtime_ns(folder):
+    try:
+        return os.stat(folder).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+# ✅ 影片清單快取：以資料夾 mtime 為鍵（新增 / 刪除 / 改名都會改變 mtime），未變化時不重新掃描
+_VIDEO_FILES_CACHE = (None, [])
+
+def _video_files(mtime):
+    """回傳 VIDEO_DIR 內的 mp4 清單；mtime 為呼叫端已取得的資料夾 mtime"""
+    global _VIDEO_FILES_CACHE
+    cached_mtime, files = _VIDEO_FILES_CACHE
+    if cached_mtime != mtime:
+        files = _list_ext(VIDEO_DIR, ".mp4")
+        # 檔案系統時間戳精度有限：mtime 太新時同一刻可能還有檔案寫入，暫不快取
+        if time.time_ns() - mtime > 1_000_000_000:
+            _VIDEO_FILES_CACHE = (mtime, files)
+    return files
+
+def _cached_json(payload, etag, cache_control=POLL_CACHE_CONTROL):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response.make_conditional(request)
+
+def _not_modified(etag, cache_control=POLL_CACHE_CONTROL):
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
 
 # ✅ List Output Files Endpoint
 @app.route("/list_output_files")
 def list_output_files():
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user", 'video')
-    files = []
-    if os.path.exists(user_folder):
-        files = [f for f in os.listdir(user_folder) if f.endswith(".mp4")]
-    return jsonify({"files": files})
+    mtime = _dir_mtime_ns(VIDEO_DIR)
+    etag = str(mtime)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    return _cached_json({"files": _video_files(mtime)}, etag)
 
 # ✅ Delete File Endpoint
 @app.route("/delete/<filename>", methods=["DELETE"])
 def delete_file(filename):
     try:
-        user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user", 'video')
+        user_folder = VIDEO_DIR
         file_path = os.path.join(user_folder, secure_filename(filename))
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -411,66 +560,70 @@ def delete_file(filename):
         app.logger.error(f"Error deleting file: {e}", exc_info=True)
         return jsonify({"status": "error", "message": f"Error deleting file: {str(e)}"}), 500
 
+# ✅ 長輪詢名額：每個等待中的 /status 會佔住一個 Waitress 執行緒，因此執行緒池另外加上這些名額（見 SERVER 設定），
+# 名額用完時改為短暫等待，長輪詢不會吃掉處理上傳等一般請求的執行緒
+LONG_POLL_SLOTS = int(os.getenv("LONG_POLL_SLOTS", "8"))
+LONG_POLL_TIMEOUT = 25
+SHORT_POLL_TIMEOUT = 1
+_LONG_POLL_SEMAPHORE = threading.BoundedSemaphore(LONG_POLL_SLOTS)
+
+def _wait_for_status_change(since):
+    """等到狀態版本不同於 since；取得長輪詢名額時最多等 LONG_POLL_TIMEOUT 秒，否則只等 SHORT_POLL_TIMEOUT 秒"""
+    long_poll = _LONG_POLL_SEMAPHORE.acquire(blocking=False)
+    try:
+        with STATUS_CHANGED:
+            STATUS_CHANGED.wait_for(
+                lambda: STATUS["version"] != since,
+                timeout=LONG_POLL_TIMEOUT if long_poll else SHORT_POLL_TIMEOUT
+            )
+    finally:
+        if long_poll:
+            _LONG_POLL_SEMAPHORE.release()
+
 # ✅ Check Processing Status Endpoint
 @app.route("/status")
 def check_status():
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user", 'video')
-    processing_file = os.path.join(user_folder, "processing.txt")
+    # 長輪詢：帶 ?since=<version> 時，等到狀態改變（或逾時）才回應
+    since = request.args.get("since", type=int)
+    if since is not None:
+        _wait_for_status_change(since)
+    with STATUS_CHANGED:
+        state, message, version = STATUS["state"], STATUS["message"], STATUS["version"]
     
-    app_logger.debug(f"🔍 檢查狀態: {processing_file}")
+    # ETag 由狀態版本與影片資料夾 mtime 組成；未變化時直接回 304，不做任何磁碟檢查
+    video_mtime = _dir_mtime_ns(VIDEO_DIR)
+    etag = f"{version}-{video_mtime}"
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag, STATUS_CACHE_CONTROL)
     
-    if not os.path.exists(processing_file):
-        # Check if there are any video files
-        if os.path.exists(user_folder):
-            files = [f for f in os.listdir(user_folder) if f.endswith(".mp4")]
-            if files:
-                app_logger.info(f"✅ 處理完成，找到 {len(files)} 個視頻檔案")
-                return jsonify({"status": "completed", "message": "Video generation completed!"})
-        app_logger.debug(f"💤 閒置狀態")
-        return jsonify({"status": "idle", "message": "No processing in progress"})
+    # 記憶體內的進行中 / 失敗狀態可直接回應，不需碰觸檔案系統
+    if state in ("processing", "failed"):
+        return _cached_json({"status": state, "message": message, "version": version}, etag, STATUS_CACHE_CONTROL)
     
-    # Read the status from the file
-    try:
-        with open(processing_file, "r") as f:
-            status_content = f.read().strip()
-        
-        app_logger.debug(f"📊 狀態檔案內容: {status_content}")
-        
-        if status_content == "processing":
-            return jsonify({"status": "processing", "message": "Processing... Please wait"})
-        elif status_content == "failed":
-            app_logger.warning(f"❌ 處理失敗狀態")
-            return jsonify({"status": "failed", "message": "Processing failed"})
-        else:
-            return jsonify({"status": "processing", "message": "Processing... Please wait"})
-    except Exception as e:
-        app_logger.error(f"❌ 檢查狀態失敗: {e}")
-        return jsonify({"status": "error", "message": f"Error checking status: {str(e)}"})
+    # 閒置 / 完成：以快取的影片清單判斷（資料夾未變化時不重新掃描），讓刪除或重啟後的結果正確反映
+    if _video_files(video_mtime):
+        app_logger.info(f"✅ 處理完成，找到視頻檔案")
+        return _cached_json({"status": "completed", "message": "Video generation completed!", "version": version}, etag, STATUS_CACHE_CONTROL)
+    app_logger.debug(f"💤 閒置狀態")
+    return _cached_json({"status": "idle", "message": "No processing in progress", "version": version}, etag, STATUS_CACHE_CONTROL)
 
 # ✅ Generate Text from PDF (First Stage)
 @app.route("/generate_text", methods=["POST"])
 def generate_text():
-    request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    request_id = _req_id()
     app_logger.info(f"📝 開始文字生成請求 ID: {request_id}")
     
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
+    user_folder = USER_DIR
     os.makedirs(user_folder, exist_ok=True)
     
     try:
         # 🧹 清除舊的 session 數據，確保新處理不受影響
-        old_session_keys = list(session.keys())
+        if app_logger.isEnabledFor(logging.DEBUG):
+            app_logger.debug("🗑️ 清除舊 session 數據: %s", list(session.keys()))
         session.clear()
-        app_logger.info(f"🗑️ 清除舊 session 數據: {old_session_keys}")
         
         # 🧹 同時清除 session backup 文件，避免重新載入舊數據
-        backup_file = os.path.join(user_folder, "session_backup.json")
-        if os.path.exists(backup_file):
-            try:
-                backup_size = os.path.getsize(backup_file)
-                os.remove(backup_file)
-                app_logger.info(f"🗑️ 刪除舊 session backup 檔案: {backup_size} bytes")
-            except Exception as e:
-                app_logger.warning(f"⚠️ 無法刪除 backup 檔案: {e}")
+        clear_session_backup()
         
         # 記錄請求參數
         app_logger.info(f"� 文字生成參數:")
@@ -499,9 +652,9 @@ def generate_text():
         app_logger.info(f"💾 儲存 PDF 檔案: {pdf_path}")
         
         try:
-            pdf_file.save(pdf_path)
-            file_size = os.path.getsize(pdf_path) / (1024 * 1024)  # MB
+            file_size = _save_upload(pdf_file, pdf_path) / (1024 * 1024)  # MB
             app_logger.info(f"✅ PDF 檔案儲存成功: {file_size:.2f} MB")
+            _discard_preview_cache()
         except Exception as save_error:
             app_logger.error(f"❌ PDF 檔案儲存失敗: {save_error}")
             raise
@@ -509,20 +662,29 @@ def generate_text():
         # Generate text using the new API function
         app_logger.info(f"🎯 開始呼叫文字生成 API...")
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         try:
             start_time = datetime.now()
             
-            generated_pages = loop.run_until_complete(
+            # 提交到常駐的 TEXT_LOOP 並等待結果（不再每個請求建立/關閉事件循環）
+            future = asyncio.run_coroutine_threadsafe(
                 api_generate_text_only(
                     pdf_file_path=pdf_path,
                     poppler_path=None,  # Use system-installed Poppler
                     num_of_pages=num_of_pages,
                     extra_prompt=extra_prompt if extra_prompt else None
-                )
+                ),
+                TEXT_LOOP
             )
+            try:
+                generated_pages = future.result(timeout=TEXT_GENERATION_TIMEOUT)
+            except FutureTimeoutError:
+                # 放棄等待並取消協程；已在執行緒中的同步 Gemini 呼叫無法中斷，會自行跑完，結果直接丟棄
+                future.cancel()
+                app_logger.error(f"❌ 請求 {request_id} 文字生成逾時（{TEXT_GENERATION_TIMEOUT} 秒）")
+                return jsonify({
+                    'status': 'error',
+                    'message': '⏰ AI 服務回應逾時，請稍後再試。'
+                }), 504
             
             end_time = datetime.now()
             processing_time = (end_time - start_time).total_seconds()
@@ -553,22 +715,12 @@ def generate_text():
                 else:
                     app_logger.info(f"  - {key}: {value}")
             
-            for key, value in session_data.items():
-                set_session_data(key, value)
-            
-            # 重要：立即驗證session數據的正確性
-            stored_pdf_path = get_session_data('pdf_path')
-            if stored_pdf_path != pdf_path:
-                app_logger.error(f"❌ Session 數據驗證失敗! 預期: {pdf_path}, 實際: {stored_pdf_path}")
-                # 強制重新設置
-                session['pdf_path'] = pdf_path
-                app_logger.info(f"🔧 強制重設 PDF 路徑: {pdf_path}")
-            else:
-                app_logger.info(f"✅ Session 數據驗證通過: {stored_pdf_path}")
+            set_session_data_many(session_data)
             
             # Debug logging
             app_logger.info(f"📊 Session 摘要 - PDF: {pdf_path}, 頁數: {len(generated_pages)}")
-            app_logger.info(f"🔑 Session keys: {list(session.keys())}")
+            if app_logger.isEnabledFor(logging.DEBUG):
+                app_logger.debug("🔑 Session keys: %s", list(session.keys()))
             
             app_logger.info(f"✅ 請求 {request_id} 文字生成完成")
             
@@ -583,41 +735,20 @@ def generate_text():
             app_logger.error(f"❌ 文字生成 API 失敗: {e}")
             app_logger.error(f"❌ 完整錯誤追蹤: {traceback.format_exc()}")
             
-            # Handle different types of errors with user-friendly messages
-            if "503" in error_message or "UNAVAILABLE" in error_message or "overloaded" in error_message:
-                app_logger.warning(f"⚠️ API 服務過載")
-                return jsonify({
-                    'status': 'error', 
-                    'message': '🚫 AI 服務目前過載，請稍後再試。這是暫時性問題，通常幾分鐘後就會恢復正常。'
-                })
-            elif "RESOURCE_EXHAUSTED" in error_message or "429" in error_message:
-                app_logger.warning(f"⚠️ API 配額耗盡")
-                return jsonify({
-                    'status': 'error', 
-                    'message': '⏰ API 配額已用完，請稍後再試或檢查 API 金鑰配置。'
-                })
-            elif "500" in error_message or "INTERNAL" in error_message:
-                app_logger.warning(f"⚠️ API 服務內部錯誤")
-                return jsonify({
-                    'status': 'error', 
-                    'message': '🔧 AI 服務內部錯誤，請稍後再試。'
-                })
-            elif "401" in error_message or "UNAUTHORIZED" in error_message:
-                app_logger.warning(f"⚠️ API 認證失敗")
-                return jsonify({
-                    'status': 'error', 
-                    'message': '🔑 API 金鑰無效或已過期，請檢查配置。'
-                })
-            else:
-                return jsonify({
-                    'status': 'error', 
-                    'message': f'❌ 文本生成失敗：{error_message}'
-                })
-        
-        finally:
-            loop.close()
-            app_logger.info(f"⚙️ 事件循環已關閉")
+            # Handle different types of errors with user-friendly messages（訊息統一取自 config/api_config.py）
+            kind = classify_error(error_message)
+            if kind is not None:
+                policy = POLICIES[kind]
+                app_logger.warning(f"⚠️ API 錯誤: {policy.description}")
+                return jsonify({'status': 'error', 'message': policy.user_msg})
+            return jsonify({
+                'status': 'error', 
+                'message': f'❌ 文本生成失敗：{error_message}'
+            })
         
+    except RequestEntityTooLarge:
+        # chunked 上傳沒有 Content-Length，讀取本文時才超過上限；交給 413 handler 回傳 JSON
+        raise
     except Exception as e:
         app_logger.error(f"❌ 請求 {request_id} 失敗: {e}")
         app_logger.error(f"❌ 完整錯誤追蹤: {traceback.format_exc()}")
@@ -626,8 +757,6 @@ def generate_text():
 # ✅ Process Video with Edited Text (Second Stage)
 @app.route("/process_with_edited_text", methods=["POST"])
 def process_with_edited_text():
-    user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
-    
     try:
         # Get data from JSON request
         request_data = request.get_json()
@@ -647,8 +776,8 @@ def process_with_edited_text():
         
         # Get saved parameters from session (with backup fallback)
         # 但首先檢查 backup 文件是否存在，如果不存在說明是新的處理會話
-        backup_file = os.path.join(user_folder, "session_backup.json")
-        if not os.path.exists(backup_file):
+        # 寫入由背景 flusher 延遲處理，因此以記憶體鏡像判斷而非檢查檔案是否存在
+        if not _get_backup_cache():
             app.logger.warning("⚠️ No session backup found, session data might be incomplete")
             return jsonify({"status": "error", "message": "Session expired, please upload PDF again"}), 400
         
@@ -657,8 +786,9 @@ def process_with_edited_text():
         
         # Enhanced debug logging
         app.logger.info(f"Session data - PDF: {pdf_path}, Pages: {len(edited_pages) if edited_pages else 0}")
-        app.logger.info(f"Session keys: {list(session.keys())}")
-        app.logger.info(f"Request data keys: {list(request_data.keys())}")
+        if app.logger.isEnabledFor(logging.DEBUG):
+            app.logger.debug("Session keys: %s", list(session.keys()))
+            app.logger.debug("Request data keys: %s", list(request_data.keys()))
         
         if not pdf_path or not edited_pages:
             missing_items = []
@@ -686,12 +816,14 @@ def process_with_edited_text():
         except (ValueError, TypeError):
             resolution = 1080
         
-        # Start processing with edited content
-        processing_thread = threading.Thread(
-            target=run_processing_with_edited_text, 
-            args=(pdf_path, edited_pages, resolution, user_folder, TTS_model_type, voice, enable_subtitles, subtitle_style, traditional_chinese)
-        )
-        processing_thread.start()
+        # Start processing with edited content（已有作業進行中時回 429）
+        if not _try_begin_job():
+            app.logger.warning("⚠️ A job is already running, rejecting /process_with_edited_text")
+            return _job_busy_response()
+        future = submit_job(run_processing_with_edited_text(
+            pdf_path, edited_pages, resolution, TTS_model_type, voice, enable_subtitles, subtitle_style, traditional_chinese
+        ))
+        future.add_done_callback(_on_edited_processing_done)
         
         app.logger.info("Processing with edited text started successfully.")
         return jsonify({"status": "success", "message": "Processing... Please wait"}), 200
@@ -700,135 +832,104 @@ def process_with_edited_text():
         app.logger.error(f"Error in /process_with_edited_text: {e}", exc_info=True)
         return jsonify({"status": "error", "message": f"Server error: {e}"}), 500
 
-def run_processing_with_edited_text(pdf_path, edited_pages, resolution, user_folder, TTS_model_type, voice, enable_subtitles=False, subtitle_style="default", traditional_chinese=False):
-    """Background processing task with edited text"""
-    process_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+async def run_processing_with_edited_text(pdf_path, edited_pages, resolution, TTS_model_type, voice, enable_subtitles=False, subtitle_style="default", traditional_chinese=False):
+    """Background processing task with edited text (runs on JOB_LOOP)"""
+    process_id = _req_id()
     app_logger.info(f"✏️ 開始編輯文字處理作業 ID: {process_id}")
     
-    # Add debug logging for parameters
-    app_logger.info(f"📊 處理參數詳情:")
-    app_logger.info(f"  - PDF 路徑: {pdf_path}")
-    app_logger.info(f"  - 編輯頁數: {len(edited_pages)}")
-    app_logger.info(f"  - 解析度: {resolution}")
-    app_logger.info(f"  - TTS 模型: {TTS_model_type}")
-    app_logger.info(f"  - 語音: {voice}")
-    app_logger.info(f"  - 啟用字幕: {enable_subtitles}")
-    app_logger.info(f"  - 字幕方法: 語速計算（固定）")
-    app_logger.info(f"  - 字幕樣式: {subtitle_style}")
-    app_logger.info(f"  - 繁體中文: {traditional_chinese}")
-    
-    # 記錄每頁編輯內容的長度
-    for i, page in enumerate(edited_pages):
-        app_logger.info(f"  - 第 {i+1} 頁: {len(page)} 字元")
-    
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    app_logger.info(f"⚙️ 事件循環已設置")
+    # Add debug logging for parameters（INFO 未啟用時整段跳過，逐頁迴圈也不執行）
+    if app_logger.isEnabledFor(logging.INFO):
+        app_logger.info("📊 處理參數詳情:")
+        app_logger.info("  - PDF 路徑: %s", pdf_path)
+        app_logger.info("  - 編輯頁數: %d", len(edited_pages))
+        app_logger.info("  - 解析度: %s", resolution)
+        app_logger.info("  - TTS 模型: %s", TTS_model_type)
+        app_logger.info("  - 語音: %s", voice)
+        app_logger.info("  - 啟用字幕: %s", enable_subtitles)
+        app_logger.info("  - 字幕方法: 語速計算（固定）")
+        app_logger.info("  - 字幕樣式: %s", subtitle_style)
+        app_logger.info("  - 繁體中文: %s", traditional_chinese)
+        
+        # 記錄每頁編輯內容的長度
+        for i, page in enumerate(edited_pages, 1):
+            app_logger.info("  - 第 %d 頁: %d 字元", i, len(page))
     
     # 🧹 清理舊檔案：在開始新處理前清除所有舊的輸出檔案
-    video_folder = os.path.join(user_folder, 'video')
-    audio_folder = os.path.join(user_folder, 'audio')
-    
-    app_logger.info(f"🗑️ 開始清理舊檔案...")
-    
-    # 刪除舊的影片和音檔
-    for folder in [video_folder, audio_folder]:
-        if os.path.exists(folder):
-            try:
-                file_count = len(os.listdir(folder))
-                app_logger.info(f"🗑️ 清理 {folder} - 包含 {file_count} 個檔案")
-                
-                import shutil
-                shutil.rmtree(folder)
-                app_logger.info(f"✅ 成功清理: {folder}")
-            except Exception as e:
-                app_logger.error(f"❌ 清理失敗 {folder}: {e}")
-    
-    # 重新建立資料夾
-    os.makedirs(video_folder, exist_ok=True)
-    os.makedirs(audio_folder, exist_ok=True)
-    app_logger.info(f"📁 重新建立資料夾完成")
-    
-    status_file = os.path.join(video_folder, "processing.txt")
-    app_logger.info(f"📝 狀態檔案: {status_file}")
-    
-    with open(status_file, "w") as f:
-        f.write("processing")
-    app_logger.info(f"✅ 狀態檔案已建立")
-    
     try:
+        app_logger.info(f"🗑️ 開始清理舊檔案...")
+        
+        # 刪除舊的影片和音檔並重建資料夾（rm -rf 在執行緒中進行，不佔用事件循環）
+        await asyncio.to_thread(_prepare_output_folders, VIDEO_DIR, AUDIO_DIR)
+        app_logger.info(f"✅ 舊檔案清理完成")
+        
         # Convert edited pages to script format
         app_logger.info(f"📝 轉換編輯頁面為腳本格式...")
-        edited_script = ""
-        for i, page in enumerate(edited_pages):
-            edited_script += f"## Page {i+1}\n{page}\n\n"
+        edited_script = "".join(f"## Page {i}\n{page}\n\n" for i, page in enumerate(edited_pages, 1))
         
-        script_length = len(edited_script)
-        app_logger.info(f"📋 腳本總長度: {script_length} 字元")
+        app_logger.info("📋 腳本總長度: %d 字元", len(edited_script))
         
         # Process with edited script
         app_logger.info(f"🎯 開始呼叫編輯腳本 API...")
         start_time = datetime.now()
         
-        loop.run_until_complete(api_with_edited_script(
+        await api_with_edited_script(
             pdf_file_path=pdf_path,
             edited_script=edited_script,
             poppler_path=None,  # Use system-installed Poppler
-            output_audio_dir=os.path.join(user_folder, 'audio'),
-            output_video_dir=os.path.join(user_folder, 'video'),
-            output_text_path=os.path.join(user_folder, "text_output.txt"),
+            output_audio_dir=AUDIO_DIR,
+            output_video_dir=VIDEO_DIR,
+            output_text_path=TEXT_OUTPUT_FILE,
             resolution=int(resolution),
             tts_model=TTS_model_type,
             voice=voice,
             enable_subtitles=enable_subtitles,
             subtitle_style=subtitle_style,
             traditional_chinese=traditional_chinese
-        ))
+        )
         
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
         app_logger.info(f"⏱️ 編輯腳本 API 處理完成，耗時: {processing_time:.2f} 秒")
         
-        # Clean up
-        if os.path.exists(status_file):
-            os.remove(status_file)
-            app_logger.info(f"🗑️ 狀態檔案已刪除")
+        set_status("completed", "Video generation completed!")
         
-        # 檢查輸出檔案
-        video_files = [f for f in os.listdir(video_folder) if f.endswith('.mp4')] if os.path.exists(video_folder) else []
-        audio_files = [f for f in os.listdir(audio_folder) if f.endswith('.mp3')] if os.path.exists(audio_folder) else []
-        
-        app_logger.info(f"📊 處理結果統計:")
-        app_logger.info(f"  - 視頻檔案: {len(video_files)} 個")
-        app_logger.info(f"  - 音頻檔案: {len(audio_files)} 個")
-        
-        if video_files:
-            for video_file in video_files:
-                video_file_path = os.path.join(video_folder, video_file)
-                file_size = os.path.getsize(video_file_path) / (1024 * 1024)  # MB
-                app_logger.info(f"  - {video_file}: {file_size:.2f} MB")
+        # 檢查輸出檔案（單次 scandir，檔案大小取自 DirEntry，彙總成一行日誌）
+        if app_logger.isEnabledFor(logging.INFO):
+            video_sizes, srt_files = [], []
+            try:
+                with os.scandir(VIDEO_DIR) as it:
+                    for entry in it:
+                        if entry.name.endswith('.mp4'):
+                            video_sizes.append(entry.stat().st_size)
+                        elif entry.name.endswith('.srt'):
+                            srt_files.append(entry.name)
+            except OSError:
+                pass  # 統計僅供日誌，資料夾已被清理時略過
+            audio_count = len(_list_ext(AUDIO_DIR, '.mp3'))
+            app_logger.info(
+                "📊 處理結果統計: 視頻 %d 個，共 %.2f MB；音頻 %d 個",
+                len(video_sizes), sum(video_sizes) / (1024 * 1024), audio_count
+            )
+            if enable_subtitles:
+                app_logger.info("  - 字幕檔案: %d 個 %s", len(srt_files), srt_files)
         
-        if enable_subtitles:
-            srt_files = [f for f in os.listdir(video_folder) if f.endswith('.srt')] if os.path.exists(video_folder) else []
-            app_logger.info(f"  - 字幕檔案: {len(srt_files)} 個")
-            for srt_file in srt_files:
-                app_logger.info(f"    - {srt_file}")
-            
         app_logger.info(f"✅ 作業 {process_id} 編輯文字處理完成!")
         
     except Exception as e:
         app_logger.error(f"❌ 作業 {process_id} 編輯文字處理失敗: {e}")
         app_logger.error(f"❌ 完整錯誤追蹤: {traceback.format_exc()}")
         
-        with open(status_file, "w") as f:
-            f.write("failed")
-        app_logger.info(f"📝 狀態檔案已更新為失敗")
-    finally:
-        try:
-            loop.close()
-            app_logger.info(f"⚙️ 事件循環已關閉")
-        except Exception as loop_error:
-            app_logger.error(f"❌ 關閉事件循環失敗: {loop_error}")
+        set_status("failed", "Processing failed")
+
+def _on_edited_processing_done(future):
+    """作業協程外拋出的例外（或作業被取消）也要把狀態標為失敗，避免一直停在 processing 而拒絕新作業"""
+    if future.cancelled():
+        set_status("failed", "Processing cancelled")
+        return
+    error = future.exception()
+    if error is not None:
+        app_logger.error(f"❌ 編輯文字處理作業異常結束: {error}", exc_info=error)
+        set_status("failed", "Processing failed")
 
 # ✅ Text Editing Page
 @app.route('/edit_text')
@@ -859,7 +960,8 @@ def edit_text():
     
     app.logger.info(f"Edit text page - Session data: PDF={pdf_path}, Pages={len(generated_pages)}")
     app.logger.info(f"Edit text page - Parameters: TTS={TTS_model_type}, Resolution={resolution}, Voice={voice}")
-    app.logger.info(f"Edit text page - Session keys: {list(session.keys())}")
+    if app.logger.isEnabledFor(logging.DEBUG):
+        app.logger.debug("Edit text page - Session keys: %s", list(session.keys()))
     
     if not generated_pages:
         flash('No generated text found. Please start from the upload page.', 'error')
@@ -876,67 +978,115 @@ def edit_text():
                           resolution=resolution,
                           voice=voice)
 
+# ✅ PDF 預覽渲染（pdftocairo 直接寫出 JPEG；高畫質模式為 PNG）
+# 渲染結果同時寫入磁碟快取，伺服器重啟後仍可直接讀取
+PREVIEW_CACHE_DIR = os.path.join(USER_DIR, "preview_cache")
+PREVIEW_JPEG_QUALITY = 85
+
+def _preview_cache_file(pdf_path, mtime, page_num, hq):
+    key = hashlib.sha1(f"{pdf_path}|{mtime}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(PREVIEW_CACHE_DIR, f"{key}-p{page_num}{'-hq.png' if hq else '.jpg'}")
+
+def _render_page_file(pdf_path, mtime, page_num, poppler_path=None, hq=False):
+    """渲染單頁 PDF 至磁碟快取並回傳檔案路徑；mtime 僅作為快取鍵，檔案更新後自動失效
+    
+    預設直接以預覽寬度 800px 光柵化為 JPEG（編碼遠快於 PNG、檔案也較小），
+    hq=True 時才用 300 DPI 並輸出無損 PNG。由 pdftocairo 直接寫檔，不經 Python 複製。
+    """
+    cache_file = _preview_cache_file(pdf_path, mtime, page_num, hq)
+    if os.path.isfile(cache_file):
+        return cache_file
+    
+    pdftocairo = os.path.join(poppler_path, "pdftocairo") if poppler_path else "pdftocairo"
+    if hq:
+        format_args = ["-png", "-r", "300"]
+    else:
+        format_args = ["-jpeg", "-jpegopt", f"quality={PREVIEW_JPEG_QUALITY}",
+                       "-scale-to-x", "800", "-scale-to-y", "-1"]
+    
+    # pdftocairo 會在輸出根名稱後自動加上副檔名；先寫入暫存名稱再原子替換，避免讀到半成品
+    os.makedirs(PREVIEW_CACHE_DIR, exist_ok=True)
+    cache_root, ext = os.path.splitext(cache_file)
+    tmp_root = f"{cache_root}.{threading.get_ident()}.tmp"
+    tmp_file = tmp_root + ext
+    try:
+        subprocess.run(
+            [pdftocairo, *format_args, "-singlefile",
+             "-f", str(page_num), "-l", str(page_num),
+             pdf_path, tmp_root],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        try:
+            os.replace(tmp_file, cache_file)
+        except FileNotFoundError:
+            return None
+    finally:
+        # pdftocairo 失敗時可能留下不完整的暫存輸出，不能留在快取資料夾
+        try:
+            os.remove(tmp_file)
+        except FileNotFoundError:
+            pass
+    return cache_file
+
+# ✅ 預覽渲染共用的執行緒池：限制同時執行的 pdftocairo 數量，同一頁的並行請求共用一次渲染
+PREVIEW_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="pdfprev")
+_PREVIEW_INFLIGHT = {}
+_PREVIEW_INFLIGHT_LOCK = threading.Lock()
+
+def _get_preview_file(pdf_path, mtime, page_num, poppler_path=None, hq=False):
+    """已快取時直接回傳路徑；否則交給 PREVIEW_POOL 渲染並等待結果"""
+    cache_file = _preview_cache_file(pdf_path, mtime, page_num, hq)
+    if os.path.isfile(cache_file):
+        return cache_file
+    
+    key = (pdf_path, mtime, page_num, hq)
+    with _PREVIEW_INFLIGHT_LOCK:
+        future = _PREVIEW_INFLIGHT.get(key)
+        if future is None:
+            future = PREVIEW_POOL.submit(_render_page_file, pdf_path, mtime, page_num, poppler_path, hq)
+            _PREVIEW_INFLIGHT[key] = future
+            future.add_done_callback(lambda _: _PREVIEW_INFLIGHT.pop(key, None))
+    return future.result()
+
 @app.route('/pdf_preview/<int:page_num>')
 def pdf_preview(page_num):
     """生成PDF頁面預覽圖片"""
     try:
-        user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
-        
         # 獲取PDF路徑
         pdf_path = get_session_data('pdf_path')
         if not pdf_path or not os.path.exists(pdf_path):
             app.logger.error(f"PDF file not found: {pdf_path}")
             return jsonify({"error": "PDF file not found"}), 404
         
-        # 設置poppler路徑
-        if system_os == "Windows":
-            poppler_path = os.path.join(BASE_DIR, "poppler", "poppler-0.89.0", "bin")
-        else:
-            poppler_path = None
+        # 高畫質模式需由前端明確要求（?hq=1）
+        hq = request.args.get('hq') == '1'
         
-        # 轉換特定頁面為圖片
+        # ETag 由 (PDF 路徑, mtime, 頁碼, hq) 決定：瀏覽器重新驗證時直接回 304，不需渲染也不需讀檔
+        mtime = os.path.getmtime(pdf_path)
+        etag = os.path.splitext(os.path.basename(_preview_cache_file(pdf_path, mtime, page_num, hq)))[0]
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        # 轉換特定頁面為圖片（Cairo 直接以 800px 寬度渲染，不需要 PIL 再縮放）
         try:
-            pages = convert_from_path(
-                pdf_path,
-                poppler_path=poppler_path,
-                first_page=page_num,
-                last_page=page_num,
-                dpi=300,  # 提高DPI以獲得更好的圖片質量
-                thread_count=1
-            )
+            try:
+                image_file = _get_preview_file(pdf_path, mtime, page_num, POPPLER_PATH, hq)
+            except subprocess.CalledProcessError as e:
+                app.logger.warning(f"pdftocairo failed for page {page_num}: {e.stderr.decode(errors='replace').strip()}")
+                image_file = None
             
-            if not pages:
+            if not image_file:
                 return jsonify({"error": f"Page {page_num} not found"}), 404
             
-            # 將圖片轉換為Base64字符串
-            page_image = pages[0]
-            
-            # 調整圖片大小以適合預覽（寬度最大800px，保持高畫質）
-            max_width = 800
-            aspect_ratio = page_image.height / page_image.width
-            new_width = min(max_width, page_image.width)
-            new_height = int(new_width * aspect_ratio)
-            
-            # 只有當原圖比目標尺寸大時才縮放，否則保持原尺寸
-            if page_image.width > max_width:
-                resized_image = page_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            else:
-                resized_image = page_image
-                new_width = page_image.width
-                new_height = page_image.height
-            
-            # 轉換為Base64，使用高質量PNG格式
-            buffer = io.BytesIO()
-            resized_image.save(buffer, format='PNG', optimize=False)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return jsonify({
-                "success": True,
-                "image": f"data:image/png;base64,{img_base64}",
-                "page": page_num,
-                "width": new_width,
-                "height": new_height
-            })
+            # 直接由磁碟快取送出檔案（支援 ETag / 304 與 Range）；同一網址在上傳新 PDF 後內容會變，因此要求瀏覽器重新驗證
+            response = send_file(image_file, mimetype='image/png' if hq else 'image/jpeg', conditional=True, etag=etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
             
         except Exception as e:
             app.logger.error(f"Error converting PDF page {page_num}: {e}")
@@ -946,40 +1096,77 @@ def pdf_preview(page_num):
         app.logger.error(f"Error in pdf_preview: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+# ✅ 背景清理狀態
+CLEANUP_STATUS = {"pending": 0}
+CLEANUP_LOCK = threading.Lock()
+
+def _do_cleanup(trash_dir):
+    """刪除暫存資料夾（於背景執行緒執行）"""
+    _fast_rmtree(trash_dir)
+
+def _on_cleanup_done(future):
+    with CLEANUP_LOCK:
+        CLEANUP_STATUS["pending"] -= 1
+    if future.exception() is not None:
+        app.logger.warning(f"⚠️ Background cleanup failed: {future.exception()}")
+
+def _discard_preview_cache():
+    """上傳新 PDF 後舊 PDF 的預覽不會再被讀取：整個快取資料夾改名後交給背景刪除，避免快取無限增長"""
+    trash_dir = os.path.join(USER_DIR, f".trash-{secrets.token_hex(4)}")
+    try:
+        os.replace(PREVIEW_CACHE_DIR, trash_dir)
+    except FileNotFoundError:
+        return
+    
+    with CLEANUP_LOCK:
+        CLEANUP_STATUS["pending"] += 1
+    future = asyncio.run_coroutine_threadsafe(asyncio.to_thread(_do_cleanup, trash_dir), BG_LOOP)
+    future.add_done_callback(_on_cleanup_done)
+
+@app.route('/cleanup_status')
+def cleanup_status():
+    """回報背景清理是否仍在進行"""
+    with CLEANUP_LOCK:
+        pending = CLEANUP_STATUS["pending"]
+    return jsonify({'status': 'running' if pending else 'done', 'pending': pending})
+
 @app.route('/cleanup_files', methods=['POST'])
 def cleanup_files():
     """清理所有產生的檔案並清除session數據"""
+    # 作業仍在寫入 video / audio 時不可清理，也不能把狀態重設為 idle（否則會放行第二個作業）
+    if _job_running():
+        app.logger.warning("⚠️ A job is still running, rejecting /cleanup_files")
+        return _job_busy_response()
+    
     try:
-        user_folder = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
+        user_folder = USER_DIR
         
         # 要清理的資料夾
-        folders_to_clean = ['video', 'audio']
+        folders_to_clean = ['video', 'audio', 'preview_cache']
         
         # 要刪除的檔案類型
         files_to_clean = []
         
-        # 收集所有要刪除的檔案
-        if os.path.exists(user_folder):
-            # 刪除PDF檔案
-            for file in os.listdir(user_folder):
-                if file.endswith('.pdf'):
-                    files_to_clean.append(os.path.join(user_folder, file))
-            
-            # 刪除text_output.txt
-            text_output = os.path.join(user_folder, "text_output.txt")
-            if os.path.exists(text_output):
-                files_to_clean.append(text_output)
-            
-            # 刪除session backup
-            session_backup = os.path.join(user_folder, "session_backup.json")
-            if os.path.exists(session_backup):
-                files_to_clean.append(session_backup)
+        # 收集所有要刪除的檔案：PDF、text_output.txt、session backup（單次 scandir，不另外 stat）
+        extra_files = {os.path.basename(TEXT_OUTPUT_FILE), os.path.basename(BACKUP_FILE)}
+        try:
+            with os.scandir(user_folder) as it:
+                for entry in it:
+                    if (entry.name.endswith('.pdf') or entry.name in extra_files) and entry.is_file():
+                        files_to_clean.append(entry.path)
+        except FileNotFoundError:
+            pass
+        
+        # 先將檔案與資料夾移入暫存資料夾（同一檔案系統內 rename 為 O(1)），
+        # 實際刪除交給背景執行緒；新上傳的同名 PDF 或新作業的資料夾不會被誤刪
+        trash_dir = os.path.join(user_folder, f".trash-{secrets.token_hex(4)}")
+        os.makedirs(trash_dir)
         
         # 刪除檔案
         deleted_files = []
         for file_path in files_to_clean:
             try:
-                os.remove(file_path)
+                os.replace(file_path, os.path.join(trash_dir, os.path.basename(file_path)))
                 deleted_files.append(os.path.basename(file_path))
                 app.logger.info(f"🗑️ Deleted file: {file_path}")
             except Exception as e:
@@ -991,22 +1178,34 @@ def cleanup_files():
             folder_path = os.path.join(user_folder, folder_name)
             if os.path.exists(folder_path):
                 try:
-                    shutil.rmtree(folder_path)
+                    os.replace(folder_path, os.path.join(trash_dir, folder_name))
                     deleted_folders.append(folder_name)
                     app.logger.info(f"🗑️ Deleted folder: {folder_path}")
                 except Exception as e:
                     app.logger.warning(f"⚠️ Could not delete folder {folder_path}: {e}")
         
+        # backup 檔已移走，記憶體鏡像需一併作廢
+        invalidate_session_backup_cache()
+        
+        with CLEANUP_LOCK:
+            CLEANUP_STATUS["pending"] += 1
+        future = asyncio.run_coroutine_threadsafe(asyncio.to_thread(_do_cleanup, trash_dir), BG_LOOP)
+        future.add_done_callback(_on_cleanup_done)
+        
         # 清除Flask session
         session.clear()
         app.logger.info("🗑️ Cleared Flask session data")
+        # 只在沒有作業進行時重設狀態（檢查與設定在同一把鎖內完成，避免與 _try_begin_job 競爭）
+        with STATUS_CHANGED:
+            if not _job_running():
+                set_status("idle", "No processing in progress")
         
         return jsonify({
-            'status': 'success',
-            'message': 'All files cleaned successfully',
+            'status': 'accepted',
+            'message': 'Cleanup scheduled',
             'deleted_files': deleted_files,
             'deleted_folders': deleted_folders
-        })
+        }), 202
         
     except Exception as e:
         app.logger.error(f"❌ Error during cleanup: {e}", exc_info=True)
@@ -1016,81 +1215,238 @@ def cleanup_files():
         }), 500
 
 # ✅ Session backup storage (simplified for single user)
+# 格式為 append-only JSONL：每次設定只追加一行 {key: value}，啟動時重播還原；
+# 記憶體內保留一份鏡像，追加行數過多時整檔壓縮重寫
+BACKUP_COMPACT_THRESHOLD = 64
+BACKUP_IO_BUFFER = 1 << 20  # 1 MB
+BACKUP_FLUSH_DELAY = 0.1  # 秒；此區間內的多次設定合併為一次寫入
+
+def _encode_backup_record(key, value):
+    if orjson is not None:
+        return orjson.dumps({key: value}) + b"\n"
+    return (json.dumps({key: value}, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+_decode_backup_record = orjson.loads if orjson is not None else json.loads
+
+_backup_cache = None
+_backup_mtime = None
+_backup_appends = 0
+_backup_dirty = {}
+_backup_lock = threading.RLock()
+_backup_wakeup = threading.Event()
+
 def save_session_backup(data):
-    """Save session data to a backup file"""
-    backup_dir = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
+    """Rewrite the backup file with one record per key (compaction)"""
+    backup_dir = USER_DIR
     os.makedirs(backup_dir, exist_ok=True)
-    backup_file = os.path.join(backup_dir, "session_backup.json")
+    backup_file = BACKUP_FILE
     
     try:
         # 特別記錄PDF路徑的保存
-        if 'pdf_path' in data:
-            app.logger.info(f"💾 Saving PDF path to backup: {data['pdf_path']}")
+        if 'pdf_path' in data and app.logger.isEnabledFor(logging.INFO):
+            app.logger.info("💾 Saving PDF path to backup: %s", data['pdf_path'])
         
-        with open(backup_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        app.logger.info(f"Session backup saved to {backup_file}")
+        payload = b"".join(_encode_backup_record(key, value) for key, value in data.items())
+        # 先寫暫存檔再 os.replace，避免中途當機留下半截的 backup（不做 fsync，交給 OS 回寫）
+        tmp_file = backup_file + ".tmp"
+        with open(tmp_file, 'wb', buffering=BACKUP_IO_BUFFER) as f:
+            f.write(payload)
+        os.replace(tmp_file, backup_file)
+        app.logger.info("Session backup saved to %s", backup_file)
     except Exception as e:
         app.logger.error(f"Failed to save session backup: {e}")
 
 def load_session_backup():
-    """Load session data from backup file"""
-    backup_dir = os.path.join(app.config["OUTPUT_FOLDER"], "default_user")
-    backup_file = os.path.join(backup_dir, "session_backup.json")
+    """Load session data by replaying the backup file"""
+    backup_file = BACKUP_FILE
     
     if not os.path.exists(backup_file):
         return {}
     
+    data = {}
     try:
-        with open(backup_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        app.logger.info(f"Session backup loaded from {backup_file}")
+        with open(backup_file, 'rb', buffering=BACKUP_IO_BUFFER) as f:
+            for line in f:
+                try:
+                    data.update(_decode_backup_record(line))
+                except ValueError:
+                    # 寫入中斷留下的殘缺行，略過即可
+                    continue
+        app.logger.info("Session backup loaded from %s", backup_file)
         return data
     except Exception as e:
         app.logger.error(f"Failed to load session backup: {e}")
         return {}
 
+def _backup_file_mtime():
+    try:
+        return os.stat(BACKUP_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _request_backup_mtime():
+    """同一個請求內只 stat 一次 backup 檔，重複讀取 session 時沿用"""
+    if not has_request_context():
+        return _backup_file_mtime()
+    mtime = g.get('_session_backup_mtime', _MISSING)
+    if mtime is _MISSING:
+        mtime = g._session_backup_mtime = _backup_file_mtime()
+    return mtime
+
+def _get_backup_cache():
+    """取得記憶體鏡像；以檔案 mtime 判斷是否需從磁碟重播"""
+    global _backup_cache, _backup_mtime, _backup_appends
+    with _backup_lock:
+        mtime = _request_backup_mtime()
+        if _backup_cache is None or mtime != _backup_mtime:
+            _backup_cache = load_session_backup()
+            # 尚未寫入的設定仍以記憶體為準
+            _backup_cache.update(_backup_dirty)
+            _backup_mtime = mtime
+            _backup_appends = 0
+        return _backup_cache
+
+def _append_session_backup(key, value):
+    """更新記憶體鏡像並標記待寫入；實際寫檔由背景 flusher 合併處理"""
+    _append_session_backup_many({key: value})
+
+def _append_session_backup_many(updates):
+    with _backup_lock:
+        _get_backup_cache().update(updates)
+        _backup_dirty.update(updates)
+    _backup_wakeup.set()
+
+def flush_session_backup():
+    """將待寫入的鍵值一次追加到 backup 檔；累積過多行時壓縮"""
+    global _backup_appends, _backup_mtime
+    with _backup_lock:
+        if not _backup_dirty:
+            return
+        payload = b"".join(_encode_backup_record(key, value) for key, value in _backup_dirty.items())
+        try:
+            os.makedirs(USER_DIR, exist_ok=True)
+            with open(BACKUP_FILE, 'ab') as f:
+                f.write(payload)
+            _backup_appends += len(_backup_dirty)
+            _backup_dirty.clear()
+        except Exception as e:
+            app.logger.error(f"Failed to append session backup: {e}")
+            return
+        if _backup_appends >= BACKUP_COMPACT_THRESHOLD:
+            save_session_backup(_backup_cache)
+            _backup_appends = 0
+        # 記下自己寫入後的 mtime，避免下次讀取時誤判為外部變更
+        _backup_mtime = _backup_file_mtime()
+
+def _backup_flusher():
+    """背景執行緒：被喚醒後稍候片刻，讓同一請求內的多次設定合併成一次寫入"""
+    while True:
+        _backup_wakeup.wait()
+        time.sleep(BACKUP_FLUSH_DELAY)
+        _backup_wakeup.clear()
+        flush_session_backup()
+
+threading.Thread(target=_backup_flusher, name="backup-flusher", daemon=True).start()
+atexit.register(flush_session_backup)
+
+def invalidate_session_backup_cache():
+    """backup 檔被外部移除或取代時呼叫，下次存取重新從磁碟載入"""
+    global _backup_cache
+    with _backup_lock:
+        _backup_cache = None
+        _backup_dirty.clear()
+
+def clear_session_backup():
+    """刪除 backup 檔並清空記憶體鏡像"""
+    global _backup_cache, _backup_mtime, _backup_appends
+    with _backup_lock:
+        try:
+            os.remove(BACKUP_FILE)
+            app.logger.info("🗑️ 刪除舊 session backup 檔案")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            app.logger.warning(f"⚠️ 無法刪除 backup 檔案: {e}")
+        _backup_cache = {}
+        _backup_mtime = None
+        _backup_appends = 0
+        _backup_dirty.clear()
+
+# 體積大的鍵只存放在伺服器端的 session backup，不寫入 cookie session（避免每個請求都夾帶數 KB 的講稿）
+SERVER_ONLY_SESSION_KEYS = frozenset({'generated_pages'})
+
 def get_session_data(key, default=None):
     """Get session data with backup fallback"""
-    # Try Flask session first
-    value = session.get(key, default)
+    if key in SERVER_ONLY_SESSION_KEYS:
+        return _get_backup_cache().get(key, default)
     
-    # 特別記錄PDF路徑的獲取
-    if key == 'pdf_path':
-        app.logger.info(f"🔍 Getting PDF path - Session value: {value}")
+    # Try Flask session first（以 sentinel 區分「不存在」與「值為 None」）
+    value = session.get(key, _MISSING)
+    
+    # 特別記錄PDF路徑的獲取（僅在 INFO 啟用時）
+    log_pdf = key == 'pdf_path' and app.logger.isEnabledFor(logging.INFO)
+    if log_pdf:
+        app.logger.info("🔍 Getting PDF path - Session value: %s", session.get(key))
     
     # If not found, try backup
-    if value is None:
-        backup_data = load_session_backup()
-        value = backup_data.get(key, default)
+    if value is _MISSING:
+        backup_data = _get_backup_cache()
+        value = backup_data.get(key, _MISSING)
+        
+        if log_pdf:
+            app.logger.info("🔍 PDF path from backup: %s", None if value is _MISSING else value)
         
-        if key == 'pdf_path':
-            app.logger.info(f"🔍 PDF path from backup: {value}")
+        if value is _MISSING:
+            return default
         
         # If found in backup, restore to session
-        if value is not None:
-            session[key] = value
-            if key == 'pdf_path':
-                app.logger.info(f"🔄 Restored PDF path to session: {value}")
+        # 只寫回 Flask session，不經過 set_session_data：值本來就來自 backup，不需再寫檔
+        session[key] = value
+        if log_pdf:
+            app.logger.info("🔄 Restored PDF path to session: %s", value)
     
     return value
 
 def set_session_data(key, value):
     """Set session data with backup"""
-    session[key] = value
+    server_only = key in SERVER_ONLY_SESSION_KEYS
+    
+    # 值未改變時直接略過（不寫 session、不寫 backup、不記錄日誌）
+    if (server_only or session.get(key, _MISSING) == value) and _get_backup_cache().get(key, _MISSING) == value:
+        return
+    
+    if not server_only:
+        session[key] = value
     
     # 特別記錄PDF路徑的設置
-    if key == 'pdf_path':
-        app.logger.info(f"🔧 Setting PDF path in session: {value}")
+    if key == 'pdf_path' and app.logger.isEnabledFor(logging.INFO):
+        app.logger.info("🔧 Setting PDF path in session: %s", value)
     
-    # Also save to backup
-    backup_data = load_session_backup()
-    backup_data[key] = value
-    save_session_backup(backup_data)
+    # Also save to backup (只追加這一個鍵)
+    _append_session_backup(key, value)
+
+def set_session_data_many(updates):
+    """Set several session keys with a single backup update"""
+    backup_data = _get_backup_cache()
+    changed = {
+        key: value for key, value in updates.items()
+        if (key not in SERVER_ONLY_SESSION_KEYS and session.get(key, _MISSING) != value)
+        or backup_data.get(key, _MISSING) != value
+    }
+    if not changed:
+        return
+    
+    session.update({key: value for key, value in changed.items() if key not in SERVER_ONLY_SESSION_KEYS})
     
-    # 驗證設置是否成功
-    if key == 'pdf_path':
-        app.logger.info(f"✅ PDF path verification - Session: {session.get(key)}, Backup will contain: {backup_data.get(key)}")
+    if 'pdf_path' in changed and app.logger.isEnabledFor(logging.INFO):
+        app.logger.info("🔧 Setting PDF path in session: %s", changed['pdf_path'])
+    
+    _append_session_backup_many(changed)
+
+SERVER_PORT = 5001
+WAITRESS_THREADS = int(os.getenv("WAITRESS_THREADS", "8"))
+# 一般請求使用 WAITRESS_THREADS 個執行緒；長輪詢的 /status 另有 LONG_POLL_SLOTS 個名額，不會佔用前者
+SERVER_THREADS = WAITRESS_THREADS + LONG_POLL_SLOTS
 
 if __name__ == "__main__":
     app_logger.info(f"🚀 Shorter Video Generator 應用程式啟動")
@@ -1101,7 +1457,9 @@ if __name__ == "__main__":
     app_logger.info(f"📁 輸出資料夾: {app.config['OUTPUT_FOLDER']}")
     
     try:
-        public_url = ngrok.connect(5001)
+        # 只在直接執行時才載入 pyngrok，以 WSGI 方式匯入 app 時不需要這個依賴
+        from pyngrok import ngrok
+        public_url = ngrok.connect(SERVER_PORT)
         app_logger.info(f"🌐 ngrok 隧道 URL: {public_url}")
         print(f" * ngrok tunnel URL: 👉👉👉 {public_url} 👈👈👈 Click here!")
     except Exception as e:
@@ -1109,6 +1467,16 @@ if __name__ == "__main__":
         print(f" * ngrok failed: {e}")
         print(" * Running locally without ngrok")
     
-    app_logger.info(f"🌍 Flask 應用程式在 0.0.0.0:5001 啟動")
-    app.run(host="0.0.0.0", port=5001, debug=False, threaded=True)
+    # 使用 Waitress 多執行緒 WSGI 伺服器，避免上傳與 /status 輪詢互相阻塞
+    try:
+        from waitress import serve
+    except ImportError:
+        serve = None
+    
+    if serve is not None:
+        app_logger.info(f"🌍 Waitress 伺服器在 0.0.0.0:{SERVER_PORT} 啟動 ({SERVER_THREADS} threads，其中 {LONG_POLL_SLOTS} 個供長輪詢)")
+        serve(app, host="0.0.0.0", port=SERVER_PORT, threads=SERVER_THREADS, connection_limit=100)
+    else:
+        app_logger.warning(f"⚠️ Waitress 未安裝，改用 Flask 開發伺服器")
+        app.run(host="0.0.0.0", port=SERVER_PORT, debug=False, threaded=True)
  
\ No newline at end of file
@@ -1,58 +1,109 @@
 # API 重試配置
 
+import re
+from enum import Enum
+from typing import NamedTuple, Optional
+
 # Gemini API 重試設置
 GEMINI_MAX_RETRIES = 10  # 最大重試次數
 GEMINI_BASE_DELAY = 5    # 基礎延遲時間（秒）
 GEMINI_MAX_DELAY = 300   # 最大延遲時間（秒）
 
-# 不同錯誤類型的處理策略
-ERROR_HANDLING_CONFIG = {
-    "503_UNAVAILABLE": {
-        "max_retries": 15,
-        "base_delay": 5,
-        "max_delay": 120,
-        "backoff_multiplier": 2,
-        "description": "服務不可用（過載）"
-    },
-    "429_QUOTA_EXCEEDED": {
-        "max_retries": 5,
-        "base_delay": 10,
-        "max_delay": 300,
-        "backoff_multiplier": 3,
-        "description": "API 配額超限"
-    },
-    "500_INTERNAL_ERROR": {
-        "max_retries": 8,
-        "base_delay": 3,
-        "max_delay": 60,
-        "backoff_multiplier": 2,
-        "description": "內部服務器錯誤"
-    },
-    "RESOURCE_EXHAUSTED": {
-        "max_retries": 10,
-        "base_delay": 2,
-        "max_delay": 60,
-        "backoff_multiplier": 2,
-        "description": "資源耗盡"
-    }
-}
 
-# 用戶友好的錯誤消息
-USER_FRIENDLY_MESSAGES = {
-    "503": "🚫 AI 服務目前過載，請稍後再試。這是暫時性問題，通常幾分鐘後就會恢復正常。",
-    "429": "⏰ API 配額已用完，請稍後再試或檢查 API 金鑰配置。",
-    "500": "🔧 AI 服務內部錯誤，請稍後再試。",
-    "401": "🔑 API 金鑰無效或已過期，請檢查配置。",
-    "UNAVAILABLE": "🚫 AI 服務暫時不可用，請稍後再試。",
-    "OVERLOADED": "🚫 AI 服務目前過載，請稍後再試。",
-    "RESOURCE_EXHAUSTED": "⏰ API 資源已用完，請稍後再試。"
-}
+class ErrorKind(str, Enum):
+    """API 錯誤類型"""
+    UNAVAILABLE_503 = "503"
+    QUOTA_429 = "429"
+    INTERNAL_500 = "500"
+    UNAUTHORIZED_401 = "401"
+    UNAVAILABLE = "UNAVAILABLE"
+    OVERLOADED = "OVERLOADED"
+    RESOURCE_EXHAUSTED = "RESOURCE_EXHAUSTED"
+
+
+class RetryPolicy(NamedTuple):
+    """重試參數"""
+    max_retries: int
+    base_delay: int          # 基礎延遲時間（秒）
+    max_delay: int           # 最大延遲時間（秒）
+    backoff_multiplier: int  # 退避倍數
+
 
-# 重試建議
-RETRY_SUGGESTIONS = {
-    "503": "建議等待 2-5 分鐘後再次嘗試",
-    "429": "建議等待 10-30 分鐘後再次嘗試",
-    "500": "建議等待 1-3 分鐘後再次嘗試",
-    "UNAVAILABLE": "建議等待 2-5 分鐘後再次嘗試",
-    "OVERLOADED": "建議等待 2-5 分鐘後再次嘗試"
+class ErrorPolicy(NamedTuple):
+    """單一錯誤類型的說明、對用戶顯示的訊息與建議，以及重試參數（未定義時為 None）"""
+    description: str
+    user_msg: str
+    suggestion: str
+    retry: Optional[RetryPolicy]
+
+
+# 不同錯誤類型的處理策略（一次查表即可取得用戶訊息、建議與重試參數）
+POLICIES = {
+    ErrorKind.UNAVAILABLE_503: ErrorPolicy(
+        "服務不可用（過載）",
+        "🚫 AI 服務目前過載，請稍後再試。這是暫時性問題，通常幾分鐘後就會恢復正常。",
+        "建議等待 2-5 分鐘後再次嘗試",
+        RetryPolicy(max_retries=15, base_delay=5, max_delay=120, backoff_multiplier=2),
+    ),
+    ErrorKind.QUOTA_429: ErrorPolicy(
+        "API 配額超限",
+        "⏰ API 配額已用完，請稍後再試或檢查 API 金鑰配置。",
+        "建議等待 10-30 分鐘後再次嘗試",
+        RetryPolicy(max_retries=5, base_delay=10, max_delay=300, backoff_multiplier=3),
+    ),
+    ErrorKind.INTERNAL_500: ErrorPolicy(
+        "內部服務器錯誤",
+        "🔧 AI 服務內部錯誤，請稍後再試。",
+        "建議等待 1-3 分鐘後再次嘗試",
+        RetryPolicy(max_retries=8, base_delay=3, max_delay=60, backoff_multiplier=2),
+    ),
+    ErrorKind.UNAUTHORIZED_401: ErrorPolicy(
+        "API 金鑰無效",
+        "🔑 API 金鑰無效或已過期，請檢查配置。",
+        "",
+        None,
+    ),
+    ErrorKind.UNAVAILABLE: ErrorPolicy(
+        "服務不可用",
+        "🚫 AI 服務暫時不可用，請稍後再試。",
+        "建議等待 2-5 分鐘後再次嘗試",
+        None,
+    ),
+    ErrorKind.OVERLOADED: ErrorPolicy(
+        "服務過載",
+        "🚫 AI 服務目前過載，請稍後再試。",
+        "建議等待 2-5 分鐘後再次嘗試",
+        None,
+    ),
+    ErrorKind.RESOURCE_EXHAUSTED: ErrorPolicy(
+        "資源耗盡",
+        "⏰ API 資源已用完，請稍後再試。",
+        "",
+        RetryPolicy(max_retries=10, base_delay=2, max_delay=60, backoff_multiplier=2),
+    ),
 }
+
+# 錯誤訊息的辨識規則（依序比對，先符合者優先）；以單字邊界比對，避免 "1500" 被誤判為 500
+# UNAVAILABLE / RESOURCE_EXHAUSTED / INTERNAL / UNAUTHORIZED 是 API 的狀態碼名稱，須區分大小寫，
+# 避免一般英文 "internal"、"unavailable" 被誤判；"overloaded" 則常以小寫出現在訊息中，不區分大小寫
+_ERROR_PATTERNS = tuple(
+    (kind, re.compile(pattern, flags))
+    for kind, pattern, flags in (
+        (ErrorKind.UNAVAILABLE_503, r"\b503\b", 0),
+        (ErrorKind.UNAVAILABLE, r"\bUNAVAILABLE\b", 0),
+        (ErrorKind.OVERLOADED, r"\bOVERLOADED\b", re.IGNORECASE),
+        (ErrorKind.QUOTA_429, r"\b429\b", 0),
+        (ErrorKind.RESOURCE_EXHAUSTED, r"\bRESOURCE_EXHAUSTED\b", 0),
+        (ErrorKind.INTERNAL_500, r"\b500\b|\bINTERNAL\b", 0),
+        (ErrorKind.UNAUTHORIZED_401, r"\b401\b|\bUNAUTHORIZED\b", 0),
+    )
+)
+
+
+def classify_error(error) -> Optional[ErrorKind]:
+    """依錯誤（或其訊息）判斷錯誤類型；無法辨識時回傳 None"""
+    message = str(error)
+    for kind, pattern in _ERROR_PATTERNS:
+        if pattern.search(message):
+            return kind
+    return None
@@ -1,13 +1,12 @@
 from google import genai
 import edge_tts
+import asyncio
 from tqdm import tqdm
 import time
 import itertools
+import functools
 import os
-import torch
-import numpy as np
 from utility.text import *
-import soundfile as sf
 
 async def edge_tts_example(text, output_dir, filename, voice="zh-CN-YunxiNeural"):
     """
@@ -52,7 +51,6 @@ async def edge_tts_example(text, output_dir, filename, voice="zh-CN-YunxiNeural"
         await communicate.save(output_file_path)
         
         # Add a small delay to ensure file is written
-        import asyncio
         await asyncio.sleep(0.2)
         
         # Verify that the file was actually created and has content
@@ -76,6 +74,12 @@ async def edge_tts_example(text, output_dir, filename, voice="zh-CN-YunxiNeural"
 
 
 
+@functools.lru_cache(maxsize=None)
+def _gemini_client(key):
+    """Returns a cached Gemini client per API key so its HTTP connections are reused across jobs."""
+    return genai.Client(api_key=key)
+
+
 def gemini_chat(text_array=None, script=None, clients=None, keys=None, max_retries=100):
     if text_array is None or script is None:
         raise ValueError("script or text_array can't be None")
@@ -85,7 +89,7 @@ def gemini_chat(text_array=None, script=None, clients=None, keys=None, max_retri
 
     # ✅ If only keys are provided, create clients
     if clients is None or len(clients) == 0:
-        clients = [genai.Client(api_key=key) for key in keys]
+        clients = [_gemini_client(key) for key in keys]
 
     # ✅ Ensure we have multiple clients to rotate
     client_cycle = itertools.cycle(clients)
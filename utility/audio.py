@@ -1,6 +1,5 @@
 import os
 import whisper
-from moviepy.editor import VideoFileClip
 import torch
 import subprocess
 def convert_mp4_to_mp3(input_file, output_file=None, bitrate="64k", sample_rate="32000"):
@@ -3,15 +3,26 @@ Colab environment font management for Chinese subtitle support
 """
 
 import os
+import functools
 import subprocess
 import logging
 import urllib.request
 import zipfile
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _available_font_families() -> frozenset:
+    """Return the lower-cased outline font families known to fontconfig (cached; cleared after fc-cache)"""
+    result = subprocess.run(
+        ["fc-list", ":outline", "-f", "%{family}\n"],
+        capture_output=True, text=True
+    )
+    return frozenset(result.stdout.lower().split('\n'))
+
 class ColabFontManager:
     """Manage fonts in Google Colab environment for Chinese subtitle support"""
     
@@ -101,29 +112,38 @@ class ColabFontManager:
                 "https://github.com/googlefonts/noto-cjk/raw/main/Sans/OTC/NotoSansCJK-Bold.ttc"
             ]
             
-            for url in font_urls:
-                font_name = url.split("/")[-1]
-                font_path = os.path.join(self.font_dir, font_name)
-                
-                if not os.path.exists(font_path):
-                    try:
-                        logger.info(f"Downloading {font_name}...")
-                        urllib.request.urlretrieve(url, font_path)
-                        logger.info(f"✅ Downloaded {font_name}")
-                        self.installed_fonts.append(font_path)
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to download {font_name}: {e}")
-                else:
-                    logger.info(f"✅ {font_name} already exists")
+            # Downloads are network-bound and write to distinct files, so fetch them concurrently
+            with ThreadPoolExecutor(max_workers=len(font_urls)) as executor:
+                downloaded = list(executor.map(self._download_font, font_urls))
+            self.installed_fonts.extend(path for path in downloaded if path)
                     
         except Exception as e:
             logger.warning(f"⚠️ Error downloading fonts: {e}")
     
+    def _download_font(self, url: str):
+        """Download a single font file; returns its path if newly downloaded"""
+        font_name = url.split("/")[-1]
+        font_path = os.path.join(self.font_dir, font_name)
+        
+        if os.path.exists(font_path):
+            logger.info(f"✅ {font_name} already exists")
+            return None
+        
+        try:
+            logger.info(f"Downloading {font_name}...")
+            urllib.request.urlretrieve(url, font_path)
+            logger.info(f"✅ Downloaded {font_name}")
+            return font_path
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to download {font_name}: {e}")
+            return None
+    
     def _update_font_cache(self):
         """Update system font cache"""
         try:
             logger.info("🔄 Updating font cache...")
             subprocess.run(["fc-cache", "-fv"], capture_output=True)
+            _available_font_families.cache_clear()
             logger.info("✅ Font cache updated")
         except Exception as e:
             logger.warning(f"⚠️ Error updating font cache: {e}")
@@ -131,20 +151,24 @@ class ColabFontManager:
     def _verify_chinese_fonts(self) -> bool:
         """Verify that Chinese fonts are available"""
         try:
-            # Check for available Chinese fonts
-            result = subprocess.run(
-                ["fc-list", ":lang=zh"], 
-                capture_output=True, text=True
-            )
-            
-            chinese_fonts = result.stdout.strip().split('\n')
-            chinese_fonts = [f for f in chinese_fonts if f.strip()]
+            # Stream fc-list line by line: keep the first few examples, only count the rest
+            chinese_fonts = []
+            font_count = 0
+            with subprocess.Popen(
+                ["fc-list", ":lang=zh"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            ) as proc:
+                for line in proc.stdout:
+                    if line.strip():
+                        font_count += 1
+                        if len(chinese_fonts) < 5:  # Show first 5
+                            chinese_fonts.append(line)
             
-            logger.info(f"Found {len(chinese_fonts)} Chinese fonts:")
-            for font in chinese_fonts[:5]:  # Show first 5
+            logger.info(f"Found {font_count} Chinese fonts (showing up to 5):")
+            for font in chinese_fonts:
                 logger.info(f"  - {font.split(':')[0]}")
             
-            return len(chinese_fonts) > 0
+            return font_count > 0
             
         except Exception as e:
             logger.warning(f"⚠️ Error verifying fonts: {e}")
@@ -163,12 +187,8 @@ class ColabFontManager:
         ]
         
         try:
-            # Get list of available fonts
-            result = subprocess.run(
-                ["fc-list", ":outline", "-f", "%{family}\n"], 
-                capture_output=True, text=True
-            )
-            available_fonts = set(result.stdout.lower().split('\n'))
+            # Get list of available fonts (cached across calls)
+            available_fonts = _available_font_families()
             
             # Find the first available preferred font
             for font in preferred_fonts:
@@ -11,6 +11,8 @@ import subprocess
 from typing import List, Dict, Tuple, Optional
 import whisper
 from moviepy.editor import VideoFileClip
+# OpenCC 轉換器與 WhisperSubtitleGenerator 共用同一個行程層級的快取
+from utility.whisper_subtitle import OPENCC_AVAILABLE, get_opencc_converter
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +40,11 @@ class HybridSubtitleGenerator:
         
         # 初始化繁體中文轉換器（如果需要）
         if traditional_chinese:
-            try:
-                import opencc
-                self.converter = opencc.OpenCC('s2t')
+            if OPENCC_AVAILABLE:
+                self.converter = get_opencc_converter('s2t')
                 self.use_opencc = True
                 logger.info("✅ Traditional Chinese conversion enabled (OpenCC)")
-            except ImportError:
+            else:
                 try:
                     import zhconv
                     self.zhconv = zhconv
@@ -16,6 +16,12 @@ from typing import List, Dict, Any, Optional
 # 設置日誌
 logger = logging.getLogger(__name__)
 
+# 中文轉換模組（可選，只在載入模組時檢查一次）
+try:
+    import zhconv
+except ImportError:
+    zhconv = None
+
 def get_available_chinese_font():
     """
     跨平台檢測可用的中文字體
@@ -90,13 +96,11 @@ class SpeechRateSubtitleGenerator:
         logger.info(f"📏 字幕生成器配置: 語速計算 + 標點符號斷句 - 每行{self.chars_per_line}字，單行顯示")
         
         # 中文轉換模組（可選）
-        try:
-            import zhconv
-            self.zhconv = zhconv
+        self.zhconv = zhconv
+        if zhconv is not None:
             logger.info("✅ 中文轉換模組載入成功")
-        except ImportError:
+        else:
             logger.warning("⚠️ 中文轉換模組未安裝，將跳過繁簡轉換")
-            self.zhconv = None
     
     
     def _smart_split_text_into_sentences(self, text: str) -> List[str]:
@@ -145,7 +149,7 @@ class SpeechRateSubtitleGenerator:
         
     def _generate_srt_content(self, segments: List[Dict]) -> str:
         """生成 SRT 字幕內容（支援長字幕切分）"""
-        srt_content = ""
+        entries = []
         subtitle_index = 1
         
         for segment in segments:
@@ -161,12 +165,11 @@ class SpeechRateSubtitleGenerator:
                 srt_end_time = self._format_time(sub_segment["end"])
                 sub_text = sub_segment["text"]
                 
-                srt_content += f"{subtitle_index}\n"
-                srt_content += f"{srt_start_time} --> {srt_end_time}\n"
-                srt_content += f"{sub_text}\n\n"
+                entries.append(f"{subtitle_index}\n{srt_start_time} --> {srt_end_time}\n{sub_text}\n\n")
                 subtitle_index += 1
         
-        return srt_content
+        # 最後一次串接，避免逐段累加字串
+        return "".join(entries)
     
     def _split_long_subtitle(self, text: str, start_time: float, end_time: float) -> List[Dict]:
         """
@@ -462,11 +465,11 @@ class SpeechRateSubtitleGenerator:
     
     def _format_time(self, seconds: float) -> str:
         """將秒數轉換為 SRT 時間格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds_remainder = seconds % 60
-        milliseconds = int((seconds_remainder % 1) * 1000)
-        seconds_int = int(seconds_remainder)
+        # 以整數毫秒計算，避免浮點餘數（如 2.3 % 1）被截斷成 299 毫秒
+        total_ms = max(0, round(seconds * 1000))
+        total_seconds, milliseconds = divmod(total_ms, 1000)
+        minutes, seconds_int = divmod(total_seconds, 60)
+        hours, minutes = divmod(minutes, 60)
         
         return f"{hours:02d}:{minutes:02d}:{seconds_int:02d},{milliseconds:03d}"
     
@@ -649,7 +652,6 @@ class SpeechRateSubtitleGenerator:
                 result = subprocess.run(cmd, capture_output=True, text=True)
                 
                 # 從 stderr 中解析時長
-                import re
                 duration_match = re.search(r'time=(\d{2}):(\d{2}):(\d{2}\.\d{2})', result.stderr)
                 if duration_match:
                     hours, minutes, seconds = duration_match.groups()
@@ -665,7 +667,6 @@ class SpeechRateSubtitleGenerator:
     
     def _count_effective_characters(self, text: str) -> int:
         """計算有效字數（排除標點和空格）"""
-        import re
         effective_chars = len(re.sub(r'[^\w]', '', text))
         return effective_chars
     
@@ -722,7 +723,6 @@ class SpeechRateSubtitleGenerator:
             sentence = sentence_info['text']
             
             # 計算句子的有效字數
-            import re
             effective_chars = len(re.sub(r'[^\w]', '', sentence))
             
             # 計算說話時間
@@ -5,9 +5,11 @@ Whisper-based subtitle generation and embedding utilities
 """
 
 import os
-import tempfile
+import re
 import subprocess
 import logging
+import warnings
+import functools
 from typing import Optional
 
 # Import OpenCC for professional Chinese conversion
@@ -24,10 +26,96 @@ try:
 except ImportError:
     ZHCONV_AVAILABLE = False
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# CJK Unified Ideographs; search() stops at the first match
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+# Built-in simplified to traditional Chinese table (fallback when OpenCC/zhconv are missing)
+_BUILTIN_S2T_TABLE = {
+    # 基本常用字
+    '这': '這', '个': '個', '中': '中', '文': '文', '测': '測', '试': '試',
+    '简': '簡', '体': '體', '繁': '繁', '转': '轉', '换': '換',
+
+    # 技術詞彙
+    '人': '人', '工': '工', '智': '智', '能': '能', '语': '語', '音': '音',
+    '识': '識', '别': '別', '技': '技', '术': '術',
+
+    # 視頻相關
+    '视': '視', '频': '頻', '字': '字', '幕': '幕', '自': '自', '动': '動',
+    '生': '生', '成': '成', '系': '系', '统': '統',
+
+    # 學習機器相關
+    '机': '機', '器': '器', '学': '學', '习': '習', '和': '和', '深': '深',
+    '度': '度', '习': '習',
+
+    # 常用詞
+    '是': '是', '一': '一', '了': '了', '在': '在', '有': '有', '的': '的',
+    '我': '我', '你': '你', '他': '他', '她': '她', '它': '它',
+    '们': '們', '来': '來', '去': '去', '说': '說', '话': '話',
+    '时': '時', '间': '間', '地': '地', '方': '方', '问': '問', '题': '題',
+    '内': '內', '容': '容', '混': '混', '合': '合', '言': '言',
+    '第': '第', '段': '段', '会': '會', '将': '將', '对': '對', '于': '於',
+    '为': '為', '与': '與', '从': '從', '到': '到', '过': '過', '得': '得',
+    '应': '應', '该': '該', '让': '讓', '给': '給', '没': '沒', '还': '還',
+    '后': '後', '前': '前', '下': '下', '上': '上', '里': '裡', '外': '外',
+    '开': '開', '关': '關', '进': '進', '出': '出', '入': '入',
+    '处': '處', '理': '理', '做': '做', '用': '用', '可': '可',
+    '要': '要', '想': '想', '看': '看', '听': '聽', '读': '讀', '写': '寫',
+
+    # 從日誌中發現的缺失字符 - 重要補充！
+    '张': '張', '讲': '講', '述': '述', '发': '發', '展': '展', '资': '資', 
+    '料': '料', '库': '庫', '结': '結', '合': '合', '趋': '趨', '势': '勢',
+    '市': '市', '场': '場', '规': '規', '模': '模', '正': '正', '快': '快',
+    '速': '速', '扩': '擴', '张': '張', '年': '年', '全': '全', '球': '球',
+    '已': '已', '经': '經', '达': '達', '月': '月', '亿': '億', '美': '美',
+    '元': '元', '预': '預', '计': '計', '突': '突', '破': '破', '万': '萬',
+    '增': '增', '长': '長', '率': '率', '高': '高', '明': '明', '越': '越',
+    '多': '多', '企': '企', '业': '業', '所': '所', '接': '接', '受': '受',
+    '应': '應', '用': '用', '同': '同', '像': '像', '微': '微', '软': '軟',
+    '些': '些', '科': '科', '巨': '巨', '头': '頭', '也': '也', '积': '積',
+    '极': '極', '投': '投', '进': '進', '步': '步', '推': '推', '另': '另',
+    '外': '外', '重': '重', '点': '點', '根': '根', '据': '據', '测': '測',
+    '超': '超', '部': '部', '署': '署', '利': '利', '清': '清', '代': '代',
+    '表': '表', '管': '管', '领': '領', '域': '域', '具': '具', '巨': '巨',
+    '大': '大', '潜': '潛', '力': '力', '接': '接', '下': '下', '头': '頭',
+    '影': '影', '片': '片', '介': '介', '绍': '紹', '就': '就', '然': '然',
+    '原': '原', '查': '查', '询': '詢', '单': '單', '日': '日', '常': '常',
+    '复': '複', '杂': '雜', '法': '法', '几': '幾', '处': '處', '降': '降',
+    '低': '低', '门': '門', '槛': '檻', '熟': '熟', '悉': '悉', '城': '城',
+    '同': '同', '己': '己', '备': '備', '意': '意', '解': '解', '析': '析',
+    '图': '圖', '准': '準', '确': '確', '提': '提', '复': '復', '转': '轉',
+    '运': '運', '太': '太', '条': '條', '件': '件', '升': '升', '减': '減',
+    '锁': '鎖', '精': '精', '确': '確', '场': '場', '景': '景', '非': '非',
+    '广': '廣', '泛': '泛', '向': '向', '制': '制', '造': '造', '医': '醫',
+    '疗': '療', '金': '金', '融': '融', '等': '等', '凡': '凡', '需': '需',
+    '及': '及', '实': '實', '数': '數', '行': '行', '使': '使', '最': '最',
+    '互': '互', '便': '便', '探': '探', '索': '索', '整': '整', '运': '運',
+    '作': '作', '流': '流', '程': '程', '首': '首', '先': '先', '接': '接',
+    '收': '收', '病': '病', '输': '輸', '今': '今', '销': '銷', '售': '售',
+    '额': '額', '少': '少', '样': '樣', '着': '著', '透': '透', '例': '例',
+    '如': '如', '分': '分', '构': '構', '取': '取', '键': '鍵', '讯': '訊',
+    '完': '完', '些': '些', '念': '念', '库': '庫', '里': '裡', '应': '應',
+    '哪': '哪', '些': '些', '讯': '訊', '成': '成', '句': '句', '且': '且',
+    '尽': '盡', '量': '量', '优': '優', '化': '化', '着': '著', '跑': '跑',
+    '更': '更', '执': '執', '从': '從', '取': '取', '求': '求', '算': '算',
+    '总': '總', '平': '平', '均': '均', '值': '值', '把': '把', '图': '圖',
+    '格': '格', '呈': '呈', '现': '現', '给': '給', '或': '或', '者': '者',
+    '够': '夠', '示': '示', '提': '提',
+
+    # 數字和標點保持不變
+    '0': '0', '1': '1', '2': '2', '3': '3', '4': '4', '5': '5', 
+    '6': '6', '7': '7', '8': '8', '9': '9',
+}
+# Compiled once at import; identity pairs are dropped since translate() keeps unmapped characters
+_BUILTIN_S2T_TRANS = str.maketrans({s: t for s, t in _BUILTIN_S2T_TABLE.items() if s != t})
+
+# Setup logging (handlers are configured by the application, not on import)
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=None)
+def get_opencc_converter(config: str = 's2t'):
+    """Return a process-wide OpenCC converter; loading its dictionaries is expensive, so build it only once"""
+    return opencc.OpenCC(config)
+
 class WhisperSubtitleGenerator:
     """Generate and embed subtitles using OpenAI Whisper and FFmpeg"""
     
@@ -52,7 +140,7 @@ class WhisperSubtitleGenerator:
                 # Try OpenCC first (most comprehensive)
                 if OPENCC_AVAILABLE:
                     try:
-                        self.opencc_converter = opencc.OpenCC('s2t')  # Simplified to Traditional
+                        self.opencc_converter = get_opencc_converter('s2t')  # Simplified to Traditional (shared instance)
                         self.use_converter = 'opencc'
                         logger.info("✅ Traditional Chinese conversion enabled (using OpenCC - professional grade)")
                     except Exception as e:
@@ -62,13 +150,9 @@ class WhisperSubtitleGenerator:
                 # Fallback to zhconv
                 if not hasattr(self, 'use_converter') or self.use_converter is None:
                     if ZHCONV_AVAILABLE:
-                        try:
-                            import zhconv
-                            self.zhconv = zhconv
-                            self.use_converter = 'zhconv'
-                            logger.info("✅ Traditional Chinese conversion enabled (using zhconv)")
-                        except ImportError:
-                            self.use_converter = None
+                        self.zhconv = zhconv  # Probed once at import time
+                        self.use_converter = 'zhconv'
+                        logger.info("✅ Traditional Chinese conversion enabled (using zhconv)")
                 
                 # Final fallback to built-in table
                 if not hasattr(self, 'use_converter') or self.use_converter is None:
@@ -99,7 +183,7 @@ class WhisperSubtitleGenerator:
                 # Try OpenCC first (most comprehensive)
                 if OPENCC_AVAILABLE:
                     try:
-                        self.opencc_converter = opencc.OpenCC('s2t')  # Simplified to Traditional
+                        self.opencc_converter = get_opencc_converter('s2t')  # Simplified to Traditional (shared instance)
                         self.use_converter = 'opencc'
                         logger.info("✅ Traditional Chinese conversion enabled (using OpenCC - professional grade)")
                     except Exception as e:
@@ -109,13 +193,9 @@ class WhisperSubtitleGenerator:
                 # Fallback to zhconv
                 if not hasattr(self, 'use_converter') or self.use_converter is None:
                     if ZHCONV_AVAILABLE:
-                        try:
-                            import zhconv
-                            self.zhconv = zhconv
-                            self.use_converter = 'zhconv'
-                            logger.info("✅ Traditional Chinese conversion enabled (using zhconv)")
-                        except ImportError:
-                            self.use_converter = None
+                        self.zhconv = zhconv  # Probed once at import time
+                        self.use_converter = 'zhconv'
+                        logger.info("✅ Traditional Chinese conversion enabled (using zhconv)")
                 
                 # Final fallback to built-in table
                 if not hasattr(self, 'use_converter') or self.use_converter is None:
@@ -335,92 +415,13 @@ class WhisperSubtitleGenerator:
     
     def _init_builtin_conversion_table(self):
         """Initialize built-in simplified to traditional Chinese conversion table"""
-        self.s2t_table = {
-            # 基本常用字
-            '这': '這', '个': '個', '中': '中', '文': '文', '测': '測', '试': '試',
-            '简': '簡', '体': '體', '繁': '繁', '转': '轉', '换': '換',
-            
-            # 技術詞彙
-            '人': '人', '工': '工', '智': '智', '能': '能', '语': '語', '音': '音',
-            '识': '識', '别': '別', '技': '技', '术': '術',
-            
-            # 視頻相關
-            '视': '視', '频': '頻', '字': '字', '幕': '幕', '自': '自', '动': '動',
-            '生': '生', '成': '成', '系': '系', '统': '統',
-            
-            # 學習機器相關
-            '机': '機', '器': '器', '学': '學', '习': '習', '和': '和', '深': '深',
-            '度': '度', '习': '習',
-            
-            # 常用詞
-            '是': '是', '一': '一', '了': '了', '在': '在', '有': '有', '的': '的',
-            '我': '我', '你': '你', '他': '他', '她': '她', '它': '它',
-            '们': '們', '来': '來', '去': '去', '说': '說', '话': '話',
-            '时': '時', '间': '間', '地': '地', '方': '方', '问': '問', '题': '題',
-            '内': '內', '容': '容', '混': '混', '合': '合', '言': '言',
-            '第': '第', '段': '段', '会': '會', '将': '將', '对': '對', '于': '於',
-            '为': '為', '与': '與', '从': '從', '到': '到', '过': '過', '得': '得',
-            '应': '應', '该': '該', '让': '讓', '给': '給', '没': '沒', '还': '還',
-            '后': '後', '前': '前', '下': '下', '上': '上', '里': '裡', '外': '外',
-            '开': '開', '关': '關', '进': '進', '出': '出', '入': '入',
-            '处': '處', '理': '理', '做': '做', '用': '用', '可': '可',
-            '要': '要', '想': '想', '看': '看', '听': '聽', '读': '讀', '写': '寫',
-            
-            # 從日誌中發現的缺失字符 - 重要補充！
-            '张': '張', '讲': '講', '述': '述', '发': '發', '展': '展', '资': '資', 
-            '料': '料', '库': '庫', '结': '結', '合': '合', '趋': '趨', '势': '勢',
-            '市': '市', '场': '場', '规': '規', '模': '模', '正': '正', '快': '快',
-            '速': '速', '扩': '擴', '张': '張', '年': '年', '全': '全', '球': '球',
-            '已': '已', '经': '經', '达': '達', '月': '月', '亿': '億', '美': '美',
-            '元': '元', '预': '預', '计': '計', '突': '突', '破': '破', '万': '萬',
-            '增': '增', '长': '長', '率': '率', '高': '高', '明': '明', '越': '越',
-            '多': '多', '企': '企', '业': '業', '所': '所', '接': '接', '受': '受',
-            '应': '應', '用': '用', '同': '同', '像': '像', '微': '微', '软': '軟',
-            '些': '些', '科': '科', '巨': '巨', '头': '頭', '也': '也', '积': '積',
-            '极': '極', '投': '投', '进': '進', '步': '步', '推': '推', '另': '另',
-            '外': '外', '重': '重', '点': '點', '根': '根', '据': '據', '测': '測',
-            '超': '超', '部': '部', '署': '署', '利': '利', '清': '清', '代': '代',
-            '表': '表', '管': '管', '领': '領', '域': '域', '具': '具', '巨': '巨',
-            '大': '大', '潜': '潛', '力': '力', '接': '接', '下': '下', '头': '頭',
-            '影': '影', '片': '片', '介': '介', '绍': '紹', '就': '就', '然': '然',
-            '原': '原', '查': '查', '询': '詢', '单': '單', '日': '日', '常': '常',
-            '复': '複', '杂': '雜', '法': '法', '几': '幾', '处': '處', '降': '降',
-            '低': '低', '门': '門', '槛': '檻', '熟': '熟', '悉': '悉', '城': '城',
-            '同': '同', '己': '己', '备': '備', '意': '意', '解': '解', '析': '析',
-            '图': '圖', '准': '準', '确': '確', '提': '提', '复': '復', '转': '轉',
-            '运': '運', '太': '太', '条': '條', '件': '件', '升': '升', '减': '減',
-            '锁': '鎖', '精': '精', '确': '確', '场': '場', '景': '景', '非': '非',
-            '广': '廣', '泛': '泛', '向': '向', '制': '制', '造': '造', '医': '醫',
-            '疗': '療', '金': '金', '融': '融', '等': '等', '凡': '凡', '需': '需',
-            '及': '及', '实': '實', '数': '數', '行': '行', '使': '使', '最': '最',
-            '互': '互', '便': '便', '探': '探', '索': '索', '整': '整', '运': '運',
-            '作': '作', '流': '流', '程': '程', '首': '首', '先': '先', '接': '接',
-            '收': '收', '病': '病', '输': '輸', '今': '今', '销': '銷', '售': '售',
-            '额': '額', '少': '少', '样': '樣', '着': '著', '透': '透', '例': '例',
-            '如': '如', '分': '分', '构': '構', '取': '取', '键': '鍵', '讯': '訊',
-            '完': '完', '些': '些', '念': '念', '库': '庫', '里': '裡', '应': '應',
-            '哪': '哪', '些': '些', '讯': '訊', '成': '成', '句': '句', '且': '且',
-            '尽': '盡', '量': '量', '优': '優', '化': '化', '着': '著', '跑': '跑',
-            '更': '更', '执': '執', '从': '從', '取': '取', '求': '求', '算': '算',
-            '总': '總', '平': '平', '均': '均', '值': '值', '把': '把', '图': '圖',
-            '格': '格', '呈': '呈', '现': '現', '给': '給', '或': '或', '者': '者',
-            '够': '夠', '示': '示', '提': '提',
-            
-            # 數字和標點保持不變
-            '0': '0', '1': '1', '2': '2', '3': '3', '4': '4', '5': '5', 
-            '6': '6', '7': '7', '8': '8', '9': '9',
-        }
+        self.s2t_table = _BUILTIN_S2T_TABLE
+        self._s2t_trans = _BUILTIN_S2T_TRANS
         logger.info(f"✅ Built-in conversion table initialized with {len(self.s2t_table)} characters")
     
     def _builtin_convert_to_traditional(self, text: str) -> str:
-        """Convert text using built-in conversion table"""
-        result = ""
-        for char in text:
-            if char in self.s2t_table:
-                result += self.s2t_table[char]
-            else:
-                result += char  # Keep original character
-        return result
+        """Convert text using built-in conversion table (characters not in the table are kept)"""
+        return text.translate(self._s2t_trans)
     
     def _convert_to_traditional_chinese(self, text: str) -> str:
         """Convert simplified Chinese text to traditional Chinese using the best available method"""
@@ -456,8 +457,7 @@ class WhisperSubtitleGenerator:
             return text
         
         # Check if text contains Chinese characters
-        chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-        if chinese_chars > 0:
+        if _CJK_RE.search(text):
             logger.info(f"🔄 Converting Chinese text: {text[:50]}...")
             converted = self._convert_to_traditional_chinese(text)
             logger.info(f"✅ Conversion result: {converted[:50]}...")
@@ -471,7 +471,6 @@ class WhisperSubtitleGenerator:
             logger.info(f"📥 Loading Whisper model: {model_size}")
             
             # Suppress PyTorch warnings in Colab
-            import warnings
             warnings.filterwarnings("ignore", category=UserWarning)
             
             self.model = self.whisper.load_model(model_size)
@@ -565,7 +564,7 @@ class WhisperSubtitleGenerator:
 
     def _create_srt_from_segments(self, segments) -> str:
         """Create SRT content from Whisper segments with optional traditional Chinese conversion"""
-        srt_content = ""
+        entries = []
         
         for i, segment in enumerate(segments, 1):
             start_time = self._format_timestamp(segment['start'])
@@ -576,18 +575,18 @@ class WhisperSubtitleGenerator:
             if self.traditional_chinese:
                 text = self._detect_and_convert_chinese(text)
             
-            srt_content += f"{i}\n"
-            srt_content += f"{start_time} --> {end_time}\n"
-            srt_content += f"{text}\n\n"
+            entries.append(f"{i}\n{start_time} --> {end_time}\n{text}\n\n")
         
-        return srt_content
+        # Join once instead of growing a string per segment
+        return "".join(entries)
 
     def _format_timestamp(self, seconds: float) -> str:
         """Convert seconds to SRT timestamp format (HH:MM:SS,mmm)"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
+        # Work in whole milliseconds so float remainders (e.g. 2.3 % 1) cannot round down
+        total_ms = max(0, round(seconds * 1000))
+        total_secs, millisecs = divmod(total_ms, 1000)
+        minutes, secs = divmod(total_secs, 60)
+        hours, minutes = divmod(minutes, 60)
         
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
 